@@ -1,19 +1,31 @@
+import hmac
 import os
-from flask import Flask, render_template, request, session, redirect
+from flask import Flask, Response, render_template, request, session, redirect
 from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect, generate_csrf
 from flask_login import LoginManager
-from .models import db, User
+from .models import db, replica_router
 from .api.user_routes import user_routes
 from .api.auth_routes import auth_routes
 from .api.pin_routes import pin_routes
 from .api.board_routes import board_routes
 from .api.comment_routes import comment_routes
+from .api.event_routes import event_routes
+from .api.pagination import PaginationError, QueryBudgetExceeded
 from .seeds import seed_commands
+from .commands import counter_commands, feed_commands, perf_commands, bench_commands, replica_commands, \
+    write_behind_commands
 from .config import Config
+from .cache import response_cache, user_cache
+from .instrumentation import instrumentation
+from .json_provider import FastJSONProvider
+from .passwords import password_hasher, PasswordHasherBusy
+from .events import event_streams
+from .write_behind import write_behind
 
 app = Flask(__name__, static_folder='../react-vite/dist', static_url_path='/')
+app.json = FastJSONProvider(app)
 app.url_map.strict_slashes = False
 
 # Setup login manager
@@ -23,11 +35,17 @@ login.login_view = 'auth.unauthorized'
 
 @login.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    return user_cache.load(int(id))
 
 
 # Tell flask about our seed commands
 app.cli.add_command(seed_commands)
+app.cli.add_command(counter_commands)
+app.cli.add_command(feed_commands)
+app.cli.add_command(perf_commands)
+app.cli.add_command(bench_commands)
+app.cli.add_command(replica_commands)
+app.cli.add_command(write_behind_commands)
 
 app.config.from_object(Config)
 app.register_blueprint(user_routes, url_prefix='/api/users')
@@ -35,8 +53,18 @@ app.register_blueprint(auth_routes, url_prefix='/api/auth')
 app.register_blueprint(pin_routes, url_prefix='/api/pins')
 app.register_blueprint(board_routes, url_prefix='/api/boards')
 app.register_blueprint(comment_routes, url_prefix='/api/comments')
+app.register_blueprint(event_routes, url_prefix='/api/events')
 db.init_app(app)
 Migrate(app, db)
+response_cache.init_app(app)
+user_cache.init_app(app)
+replica_router.init_app(app)
+password_hasher.init_app(app)
+event_streams.init_app(app)
+write_behind.init_app(app)
+instrumentation.init_app(app)
+instrumentation.watch_cache('response', response_cache)
+instrumentation.watch_cache('user', user_cache)
 
 # Application Security
 # For development, allow localhost origins
@@ -63,6 +91,17 @@ else:
 # Therefore, we need to make sure that in production any
 # request made over http is redirected to https.
 # Well.........
+@app.before_request
+def start_instrumentation():
+    instrumentation.start_request()
+
+
+@app.before_request
+def route_reads():
+    # Reads of GET requests go to a replica, if any are configured
+    replica_router.route_request()
+
+
 @app.before_request
 def https_redirect():
     if os.environ.get('FLASK_ENV') == 'production':
@@ -84,6 +123,31 @@ def inject_csrf_token(response):
     return response
 
 
+@app.after_request
+def record_write(response):
+    return replica_router.record_write(response)
+
+
+@app.after_request
+def finish_instrumentation(response):
+    # Adds the Server-Timing header, records metrics and logs requests that
+    # went over their query or latency budget
+    return instrumentation.finish_request(response)
+
+
+@app.route("/api/_metrics")
+def metrics():
+    """
+    Returns this process's request and query metrics for Prometheus, to
+    scrapers sending INSTRUMENTATION_METRICS_TOKEN as a bearer token
+    """
+    token = app.config.get('INSTRUMENTATION_METRICS_TOKEN')
+    if not token or not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        # Not there for anyone else
+        return {'error': 'Not found'}, 404
+    return Response(instrumentation.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route("/api/csrf/restore")
 def restore_csrf():
     """
@@ -117,6 +181,21 @@ def react_root(path):
     return app.send_static_file('index.html')
 
 
+@app.errorhandler(PaginationError)
+def pagination_error(e):
+    return {'error': str(e)}, 400
+
+
+@app.errorhandler(QueryBudgetExceeded)
+def query_budget_exceeded(e):
+    return {'error': 'This list took too long to load, try a narrower query'}, 503
+
+
+@app.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(e):
+    return {'errors': {'message': 'Too many sign ins and sign ups right now, please try again'}}, 503, {'Retry-After': '1'}
+
+
 @app.errorhandler(404)
 def not_found(e):
     return app.send_static_file('index.html')
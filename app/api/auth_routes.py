@@ -1,8 +1,11 @@
 from flask import Blueprint, request
+from sqlalchemy.exc import IntegrityError
 from app.models import User, db
 from app.forms import LoginForm
 from app.forms import SignUpForm
 from flask_login import current_user, login_user, logout_user, login_required
+from app.cache import user_cache
+from app.passwords import password_hasher
 
 auth_routes = Blueprint('auth', __name__)
 
@@ -29,8 +32,12 @@ def login():
     form['csrf_token'].data = csrf_token
     if form.validate_on_submit():
         # Add the user to the session, we are logged in!
-        user = User.query.filter(User.email == form.data['email']).first()
+        user = form.user
+        if form.new_password_hash:
+            user.replace_password_hash(form.new_password_hash)
+            db.session.commit()
         login_user(user)
+        user_cache.refresh(user)
         return user.to_dict()
     return form.errors, 401
 
@@ -41,6 +48,7 @@ def logout():
     Logs a user out
     """
     logout_user()
+    user_cache.forget()
     return {'message': 'User logged out'}
 
 
@@ -56,14 +64,26 @@ def sign_up():
         user = User(
             username=form.data['username'],
             email=form.data['email'],
-            password=form.data['password'],
+            hashed_password=password_hasher.hash(form.data['password']),
             first_name=form.data['first_name'],
             last_name=form.data['last_name']
         )
         db.session.add(user)
-        db.session.commit()
+        try:
+            # The unique constraints on username and email are the only
+            # check, so concurrent signups can't both get through
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            if not form.add_taken_errors():
+                raise
+            return form.errors, 401
+        # Everything is read before the commit expires the user
         login_user(user)
-        return user.to_dict()
+        user_cache.refresh(user)
+        user_dict = user.to_dict()
+        db.session.commit()
+        return user_dict
     return form.errors, 401
 
 
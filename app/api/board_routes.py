@@ -1,8 +1,14 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
-from app.models import db, Board, Pin, BoardFollower
+from app.models import db, Board, Pin, BoardFollower, set_counted_row, project_pins, pin_dicts, project_boards, \
+    board_dicts
 from app.forms import BoardForm
+from app.api.pagination import keyset_paginate, offset_paginate, page_args, budgeted
+from app.api.streaming import stream_collection
+from app.cache import response_cache
+from app.write_behind import write_behind
 from sqlalchemy import desc
+from sqlalchemy.orm import joinedload
 
 board_routes = Blueprint('boards', __name__)
 
@@ -10,17 +16,18 @@ board_routes = Blueprint('boards', __name__)
 @login_required
 def get_user_boards():
     """Get current user's boards"""
-    boards = Board.query.filter_by(user_id=current_user.id)\
+    boards = project_boards(Board.query.filter_by(user_id=current_user.id))\
         .order_by(desc(Board.created_at)).all()
     
     return jsonify({
-        'boards': [board.to_dict(include_stats=True) for board in boards]
+        'boards': board_dicts(boards)
     })
 
 @board_routes.route('/<int:board_id>')
+@response_cache.cached('board:{board_id}')
 def get_board(board_id):
     """Get a specific board"""
-    board = Board.query.get(board_id)
+    board = Board.query.options(joinedload(Board.user)).get(board_id)
     if not board:
         return jsonify({'error': 'Board not found'}), 404
     
@@ -28,7 +35,12 @@ def get_board(board_id):
     if board.is_private and (not current_user.is_authenticated or board.user_id != current_user.id):
         return jsonify({'error': 'Board is private'}), 403
     
-    return jsonify(board.to_dict(include_stats=True, include_pins=True))
+    # Only the owner can see a private board, keep it out of the shared cache
+    if board.is_private:
+        response_cache.skip()
+    response_cache.tag(f'user:{board.user_id}')
+    
+    return jsonify(Board.to_dict_many([board], include_pins=True)[0])
 
 @board_routes.route('', methods=['POST'], strict_slashes=False)
 @login_required
@@ -48,6 +60,8 @@ def create_board():
         db.session.add(board)
         db.session.commit()
         
+        response_cache.invalidate(f'user:{current_user.id}', f'boards:{current_user.id}')
+        
         return jsonify(board.to_dict(include_stats=True)), 201
     
     return jsonify({'errors': form.errors}), 400
@@ -56,7 +70,7 @@ def create_board():
 @login_required
 def update_board(board_id):
     """Update a board"""
-    board = Board.query.get(board_id)
+    board = Board.query.options(joinedload(Board.user)).get(board_id)
     if not board:
         return jsonify({'error': 'Board not found'}), 404
     
@@ -73,7 +87,9 @@ def update_board(board_id):
         
         db.session.commit()
         
-        return jsonify(board.to_dict(include_stats=True))
+        response_cache.invalidate(f'board:{board_id}', f'boards:{current_user.id}')
+        
+        return jsonify(Board.to_dict_many([board])[0])
     
     return jsonify({'errors': form.errors}), 400
 
@@ -88,15 +104,24 @@ def delete_board(board_id):
     if board.user_id != current_user.id:
         return jsonify({'error': 'Unauthorized'}), 403
     
+    # The board's pins are deleted with it
+    pin_ids = [pin.id for pin in board.pins]
+    
     db.session.delete(board)
     db.session.commit()
     
+    response_cache.invalidate(f'board:{board_id}', f'boards:{current_user.id}', f'user:{current_user.id}')
+    for pin_id in pin_ids:
+        response_cache.invalidate(f'pin:{pin_id}', f'comments:{pin_id}')
+    
     return jsonify({'message': 'Board deleted successfully'})
 
 @board_routes.route('/<int:board_id>/pins')
+@response_cache.cached('board:{board_id}')
+@budgeted
 def get_board_pins(board_id):
     """Get all pins in a board"""
-    board = Board.query.get(board_id)
+    board = Board.query.options(joinedload(Board.user)).get(board_id)
     if not board:
         return jsonify({'error': 'Board not found'}), 404
     
@@ -104,26 +129,32 @@ def get_board_pins(board_id):
     if board.is_private and (not current_user.is_authenticated or board.user_id != current_user.id):
         return jsonify({'error': 'Board is private'}), 403
     
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
-    
-    pins_paginated = Pin.query.filter_by(board_id=board_id)\
-        .order_by(desc(Pin.created_at))\
-        .paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
+    # Only the owner can see a private board, keep it out of the shared cache
+    if board.is_private:
+        response_cache.skip()
+    # Every pin in a board belongs to the board's owner
+    response_cache.tag(f'user:{board.user_id}')
+    
+    cursor, page, per_page = page_args()
+    board_dict = Board.to_dict_many([board])[0]
+    
+    if cursor is not None:
+        pins_page = keyset_paginate(project_pins(Pin.query.filter_by(board_id=board_id)), Pin.created_at, Pin.id,
+                                    cursor, per_page)
+        return jsonify({
+            'pins': pin_dicts(pins_page.items),
+            'board': board_dict,
+            **pins_page.to_dict()
+        })
+    
+    pins_query = project_pins(Pin.query.filter_by(board_id=board_id))\
+        .order_by(desc(Pin.created_at))
+    pins_paginated = offset_paginate(pins_query, page, per_page)
     
     return jsonify({
-        'pins': [pin.to_dict() for pin in pins_paginated.items],
-        'board': board.to_dict(include_stats=True),
-        'page': page,
-        'pages': pins_paginated.pages,
-        'per_page': per_page,
-        'total': pins_paginated.total,
-        'has_next': pins_paginated.has_next,
-        'has_prev': pins_paginated.has_prev
+        'pins': pin_dicts(pins_paginated.items),
+        'board': board_dict,
+        **pins_paginated.to_dict()
     })
 
 @board_routes.route('/<int:board_id>/follow', methods=['POST'])
@@ -140,47 +171,82 @@ def follow_board(board_id):
     if board.user_id == current_user.id:
         return jsonify({'error': 'Cannot follow your own board'}), 400
     
-    existing_follow = BoardFollower.query.filter_by(
-        user_id=current_user.id,
-        board_id=board_id
-    ).first()
-    
-    if existing_follow:
-        # Unfollow the board
-        db.session.delete(existing_follow)
-        following = False
-    else:
-        # Follow the board
-        follow = BoardFollower(user_id=current_user.id, board_id=board_id)
-        db.session.add(follow)
-        following = True
+    # A toggle still in the write-behind queue is newer than the database
+    following = write_behind.pending('board_follow', current_user.id, board_id)
+    if following is None:
+        following = BoardFollower.query.filter_by(
+            user_id=current_user.id,
+            board_id=board_id
+        ).first() is not None
+    
+    # Follow the board, or unfollow it if already following
+    return _set_board_follow(board, not following)
+
+@board_routes.route('/<int:board_id>/follow', methods=['PUT'])
+@login_required
+def add_board_follow(board_id):
+    """Follow a board, following it again changes nothing"""
+    board = Board.query.get(board_id)
+    if not board:
+        return jsonify({'error': 'Board not found'}), 404
     
+    if board.is_private:
+        return jsonify({'error': 'Cannot follow private board'}), 403
+    
+    if board.user_id == current_user.id:
+        return jsonify({'error': 'Cannot follow your own board'}), 400
+    
+    return _set_board_follow(board, True)
+
+@board_routes.route('/<int:board_id>/follow', methods=['DELETE'])
+@login_required
+def remove_board_follow(board_id):
+    """Unfollow a board, unfollowing it again changes nothing"""
+    board = Board.query.get(board_id)
+    if not board:
+        return jsonify({'error': 'Board not found'}), 404
+    
+    return _set_board_follow(board, False)
+
+def _set_board_follow(board, following):
+    if write_behind.enabled:
+        # Applied by the write-behind flusher
+        followers_count = write_behind.enqueue('board_follow', current_user.id, board.id, following)
+        return jsonify({'following': following, 'followers_count': followers_count}), 202
+    
+    # Atomic insert/delete, so concurrent toggles can't race into a
+    # unique_board_follow IntegrityError or skew followers_count
+    changed, followers_count = set_counted_row(
+        BoardFollower, following, Board, 'followers_count',
+        user_id=current_user.id,
+        board_id=board.id
+    )
     db.session.commit()
     
+    if changed:
+        response_cache.invalidate(f'board:{board.id}', f'boards:{board.user_id}')
+    
     return jsonify({
         'following': following,
-        'followers_count': len(board.followers)
+        'followers_count': followers_count
     })
 
 @board_routes.route('/user/<int:user_id>')
+@response_cache.cached('boards:{user_id}', 'user:{user_id}')
 def get_user_boards_public(user_id):
     """Get public boards by a specific user"""
-    boards = Board.query.filter_by(user_id=user_id, is_private=False)\
-        .order_by(desc(Board.created_at)).all()
+    boards = project_boards(Board.query.filter_by(user_id=user_id, is_private=False))\
+        .order_by(desc(Board.created_at))
     
-    return jsonify({
-        'boards': [board.to_dict(include_stats=True) for board in boards]
-    })
+    return stream_collection('boards', boards, board_dicts)
 
 @board_routes.route('/following')
 @login_required
 def get_followed_boards():
     """Get boards followed by current user"""
-    followed_boards = db.session.query(Board)\
+    followed_boards = project_boards(Board.query)\
         .join(BoardFollower, Board.id == BoardFollower.board_id)\
         .filter(BoardFollower.user_id == current_user.id)\
-        .order_by(desc(BoardFollower.created_at)).all()
+        .order_by(desc(BoardFollower.created_at))
     
-    return jsonify({
-        'boards': [board.to_dict(include_stats=True) for board in followed_boards]
-    })
\ No newline at end of file
+    return stream_collection('boards', followed_boards, board_dicts)
\ No newline at end of file
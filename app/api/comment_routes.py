@@ -1,10 +1,23 @@
 from flask import Blueprint, request, jsonify
 from flask_login import current_user, login_required
-from app.models import Comment, Pin, db
+from app.models import Comment, Pin, db, project_comments, comment_dicts
 from app.forms import CommentForm
+from app.cache import response_cache
+from app.events import event_streams
+from app.api.pagination import keyset_paginate, encode_cursor, page_args, budgeted
 
 comment_routes = Blueprint('comments', __name__)
 
+def _invalidate_pin_comments(pin):
+    # The pin's comments_count shows up in the pin and in its board's pages
+    response_cache.invalidate(f'comments:{pin.id}', f'pin:{pin.id}')
+    if pin.board_id:
+        response_cache.invalidate(f'board:{pin.board_id}')
+
+def _publish_pin_comment(pin, name, **data):
+    # Live update for the open pages of the pin, see event_routes
+    event_streams.publish(f'pin:{pin.id}', name, dict(data, pin_id=pin.id, comments_count=pin.comments_count))
+
 @comment_routes.route('', methods=['POST'])
 @login_required
 def create_comment():
@@ -39,10 +52,16 @@ def create_comment():
         try:
             db.session.add(comment)
             db.session.commit()
-            return jsonify(comment.to_dict()), 201
         except Exception as e:
             db.session.rollback()
             return jsonify({'error': 'Failed to create comment'}), 500
+
+        _invalidate_pin_comments(pin)
+        comment_dict = comment.to_dict()
+        _publish_pin_comment(pin, 'comment_created', comment=comment_dict)
+        # Notifies the pin's owner
+        event_streams.publish(f'user:{pin.user_id}', 'comment', {'pin_id': pin.id, 'comment': comment_dict})
+        return jsonify(comment_dict), 201
     
     return jsonify({'errors': form.errors}), 400
 
@@ -67,7 +86,10 @@ def update_comment(comment_id):
     if form.validate_on_submit():
         comment.content = form.content.data
         db.session.commit()
-        return jsonify(comment.to_dict()), 200
+        response_cache.invalidate(f'comments:{comment.pin_id}')
+        comment_dict = comment.to_dict()
+        _publish_pin_comment(comment.pin, 'comment_updated', comment=comment_dict)
+        return jsonify(comment_dict), 200
     
     return jsonify({'errors': form.errors}), 400
 
@@ -83,21 +105,42 @@ def delete_comment(comment_id):
     if comment.user_id != current_user.id:
         return jsonify({'error': 'Unauthorized'}), 403
     
+    pin = comment.pin
     db.session.delete(comment)
     db.session.commit()
+    _invalidate_pin_comments(pin)
+    _publish_pin_comment(pin, 'comment_deleted', comment_id=comment_id)
     
     return jsonify({'message': 'Comment deleted successfully'}), 200
 
 @comment_routes.route('/pin/<int:pin_id>', methods=['GET'])
+@response_cache.cached('comments:{pin_id}')
+@budgeted
 def get_pin_comments(pin_id):
-    """Get all comments for a specific pin"""
+    """
+    Get the comments of a pin, newest first, a page at a time. Pass the
+    latest_cursor of a response as ?since= to get only newer comments.
+    """
     pin = Pin.query.get(pin_id)
     
     if not pin:
         return jsonify({'error': 'Pin not found'}), 404
     
-    comments = Comment.query.filter_by(pin_id=pin_id).order_by(Comment.created_at.desc()).all()
+    cursor, page, per_page = page_args()
+    since = request.args.get('since')
+    comments_query = project_comments(Comment.query.filter_by(pin_id=pin_id))
+    comments_page = keyset_paginate(
+        comments_query, Comment.created_at, Comment.id, cursor, per_page, since=since
+    )
+    response_cache.tag(*{f'user:{comment.user_id}' for comment in comments_page.items})
+    
+    # The newest comment the client has seen, for its next ?since=
+    latest_cursor = since
+    if comments_page.items and not cursor:
+        latest_cursor = encode_cursor((comments_page.items[0].created_at, comments_page.items[0].id))
     
     return jsonify({
-        'comments': [comment.to_dict() for comment in comments]
-    }), 200
\ No newline at end of file
+        'comments': comment_dicts(comments_page.items),
+        'latest_cursor': latest_cursor,
+        **comments_page.to_dict()
+    })
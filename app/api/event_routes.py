@@ -0,0 +1,38 @@
+from flask import Blueprint, Response, jsonify, request
+from flask_login import current_user, login_required
+from app.models import Pin
+from app.events import event_streams
+
+event_routes = Blueprint('events', __name__)
+
+
+def _event_stream(channels):
+    events = event_streams.stream(channels, request.headers.get('Last-Event-ID'))
+    if events is None:
+        return jsonify({'error': 'Too many live updates open, try again later'}), 503, {'Retry-After': '30'}
+
+    # Not wrapped in stream_with_context: the request context, and the
+    # database connection of its session, are released before the stream
+    # starts instead of being held for as long as the client listens
+    return Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Keeps nginx and the like from buffering the events
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@event_routes.route('/pins/<int:pin_id>')
+def get_pin_events(pin_id):
+    """Server-Sent Events of a pin's new, edited and deleted comments and its likes count"""
+    pin = Pin.query.get(pin_id)
+    if not pin:
+        return jsonify({'error': 'Pin not found'}), 404
+
+    return _event_stream([f'pin:{pin_id}'])
+
+
+@event_routes.route('/me')
+@login_required
+def get_my_events():
+    """Server-Sent Events of the comments and likes on the current user's pins"""
+    return _event_stream([f'user:{current_user.id}'])
@@ -0,0 +1,294 @@
+import base64
+import hashlib
+import json
+import math
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from flask import current_app, request
+from sqlalchemy import and_, or_, desc, select
+from sqlalchemy.exc import OperationalError
+from app.cache import MemoryCache
+from app.models import db
+
+
+class PaginationError(ValueError):
+    """Raised for malformed pagination parameters, answered with a 400"""
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a list request runs past its statement timeout, answered with a 503"""
+
+
+def _positive_int(name, default):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise PaginationError(f'{name} must be an integer')
+    if value < 1:
+        raise PaginationError(f'{name} must be positive')
+    return value
+
+
+def page_args():
+    """
+    Parses the ?cursor=, ?page= and ?per_page= of a list request into
+    (cursor, page, per_page). per_page defaults to PAGINATION_PER_PAGE and
+    is capped at PAGINATION_MAX_PER_PAGE.
+
+    OFFSET pages make the database walk every row before the page, so page
+    numbers can only reach PAGINATION_ROW_BUDGET rows deep. Cursors seek
+    straight to their rows and have no such limit.
+    """
+    config = current_app.config
+    cursor = request.args.get('cursor')
+    page = _positive_int('page', 1)
+    per_page = min(_positive_int('per_page', config.get('PAGINATION_PER_PAGE', 20)),
+                   config.get('PAGINATION_MAX_PER_PAGE', 100))
+
+    if cursor is None and page * per_page > config.get('PAGINATION_ROW_BUDGET', 10000):
+        raise PaginationError('page is too deep, use cursor pagination (?cursor=) instead')
+    return cursor, page, per_page
+
+
+def _read_connection():
+    # The connection the request's SELECTs run on, a replica's when the
+    # request was routed to one
+    return db.session.connection(bind_arguments={'clause': select(1)})
+
+
+@contextmanager
+def statement_timeout(milliseconds):
+    """
+    Cancels the statements run inside the block after milliseconds, with
+    SET LOCAL statement_timeout on PostgreSQL and a progress handler on
+    SQLite. Raises QueryBudgetExceeded when a statement is cancelled.
+    """
+    connection = _read_connection()
+    dialect = connection.dialect.name
+    driver_connection = connection.connection.driver_connection
+
+    if dialect == 'postgresql':
+        # Lasts until the end of the request's transaction
+        connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(milliseconds)}')
+    elif dialect == 'sqlite':
+        deadline = time.monotonic() + milliseconds / 1000
+        # A non-zero return interrupts the running statement
+        driver_connection.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+
+    cancelled = False
+    try:
+        yield
+    except OperationalError as error:
+        if getattr(error.orig, 'pgcode', None) != '57014' and 'interrupted' not in str(error.orig):
+            raise
+        cancelled = True
+    finally:
+        if dialect == 'sqlite':
+            driver_connection.set_progress_handler(None, 0)
+
+    if cancelled:
+        db.session.rollback()
+        raise QueryBudgetExceeded(f'Query cancelled after {milliseconds} ms')
+
+
+def budgeted(view):
+    """Runs a list view under the LIST_QUERY_TIMEOUT_MS statement timeout"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with statement_timeout(current_app.config.get('LIST_QUERY_TIMEOUT_MS', 2000)):
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def encode_cursor(values):
+    """Packs the sort key of the last row into an opaque, URL-safe token"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Unpacks a token made by encode_cursor into a (created_at, id) tuple"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+
+
+class KeysetPage:
+    """One page of a keyset-paginated query"""
+
+    def __init__(self, items, per_page, next_cursor):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def to_dict(self):
+        return {
+            'per_page': self.per_page,
+            'next_cursor': self.next_cursor,
+            'has_next': self.has_next
+        }
+
+
+def keyset_paginate(query, created_at, row_id, cursor, per_page, key=None, since=None):
+    """
+    Paginates a query newest-first on (created_at, row_id) by seeking past the
+    cursor instead of using OFFSET, so every page costs the same however deep
+    it is. No total count is computed.
+
+    key maps a result row to its (created_at, id) sort values; by default the
+    row's created_at and id attributes are used. Rows are returned as-is.
+
+    since, a cursor too, limits the pages to the rows that came after it, so
+    clients can fetch just what is new since the newest row they have.
+    """
+    if per_page < 1:
+        raise PaginationError('per_page must be positive')
+
+    if since:
+        since_created_at, since_id = decode_cursor(since)
+        query = query.filter(or_(
+            created_at > since_created_at,
+            and_(created_at == since_created_at, row_id > since_id)
+        ))
+
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            created_at < cursor_created_at,
+            and_(created_at == cursor_created_at, row_id < cursor_id)
+        ))
+
+    rows = query.order_by(None)\
+        .order_by(desc(created_at), desc(row_id))\
+        .limit(per_page + 1)\
+        .all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(key(last) if key else (last.created_at, last.id))
+
+    return KeysetPage(rows, per_page, next_cursor)
+
+
+COUNT_STRATEGIES = ('exact', 'cached', 'estimated', 'none')
+
+# Totals of the 'cached' strategy, keyed by the filtered query
+_counts = MemoryCache(max_entries=4096)
+
+
+class OffsetPage:
+    """One page of an offset-paginated query"""
+
+    def __init__(self, items, page, per_page, total, has_next):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.has_next = has_next
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def pages(self):
+        if self.total is None:
+            return None
+        return math.ceil(self.total / self.per_page)
+
+    def to_dict(self):
+        return {
+            'page': self.page,
+            'pages': self.pages,
+            'per_page': self.per_page,
+            'total': self.total,
+            'has_next': self.has_next,
+            'has_prev': self.has_prev
+        }
+
+
+def _exact_count(query):
+    return query.order_by(None).count()
+
+
+def _cached_count(query):
+    # Keyed by the SQL and parameters of the filtered query, so every filter
+    # (search terms, user, board...) has its own total
+    compiled = query.order_by(None).statement.compile(dialect=db.engine.dialect)
+    key = hashlib.sha1(f'{compiled}|{sorted(compiled.params.items())}'.encode()).hexdigest()
+    total = _counts.get(key)
+    if total is None:
+        total = _exact_count(query)
+        _counts.set(key, total, ttl=current_app.config.get('PAGINATION_COUNT_TTL', 60))
+    return total
+
+
+def _estimated_count(query):
+    """
+    The planner's row estimate for the query on PostgreSQL, which comes from
+    pg_class.reltuples and the column statistics instead of a scan. Other
+    databases have no estimate and use the cached count.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return _cached_count(query)
+    compiled = query.order_by(None).statement.compile(
+        dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True}
+    )
+    plan = _read_connection().exec_driver_sql(f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params).scalar()
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def offset_paginate(query, page, per_page, count=None, default_count=None):
+    """
+    Paginates a query with LIMIT/OFFSET. per_page + 1 rows are fetched, so
+    has_next is always exact whatever the count strategy:
+
+    - 'exact' runs a COUNT(*) of the filtered query on every request
+    - 'cached' reuses that count for PAGINATION_COUNT_TTL seconds
+    - 'estimated' reads the PostgreSQL planner's estimate
+    - 'none' skips counting, total and pages are null
+
+    count defaults to the request's ?count=, then to the endpoint's
+    default_count (e.g. 'none' for infinite scroll, which only needs
+    has_next) and then to PAGINATION_COUNT_STRATEGY. page and per_page come
+    from page_args().
+    """
+    count = count or request.args.get('count') or default_count or \
+        current_app.config.get('PAGINATION_COUNT_STRATEGY', 'exact')
+    if count not in COUNT_STRATEGIES:
+        raise PaginationError(f'count must be one of {", ".join(COUNT_STRATEGIES)}')
+    rows = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if count == 'none':
+        total = None
+    elif not has_next and (rows or page == 1):
+        # The last page gives the exact total for free
+        total = (page - 1) * per_page + len(rows)
+    elif count == 'exact':
+        total = _exact_count(query)
+    elif count == 'cached':
+        total = _cached_count(query)
+    else:
+        total = _estimated_count(query)
+    if total is not None and rows:
+        # An estimate or a stale count can't be less than what was just read
+        total = max(total, (page - 1) * per_page + len(rows) + has_next)
+
+    return OffsetPage(rows, page, per_page, total, has_next)
@@ -1,62 +1,58 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
-from app.models import db, Pin, Board, Like
+from app.models import db, Pin, Board, Like, search_pins, fan_out_pin, set_counted_row, project_pins, pin_dicts
 from app.forms import PinForm
-from sqlalchemy import desc, or_
+from app.api.pagination import keyset_paginate, offset_paginate, page_args, budgeted
+from app.cache import response_cache
+from app.events import event_streams
+from app.write_behind import write_behind
+from sqlalchemy import desc
 
 pin_routes = Blueprint('pins', __name__)
 
 @pin_routes.route('', strict_slashes=False)
+@budgeted
 def get_pins():
     """Get all pins with pagination"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
-    search = request.args.get('search', '')
-    category = request.args.get('category', '')
-    
-    query = Pin.query
-    
-    # Search functionality
-    if search:
-        query = query.filter(
-            or_(
-                Pin.title.ilike(f'%{search}%'),
-                Pin.description.ilike(f'%{search}%')
-            )
-        )
+    cursor, page, per_page = page_args()
+    search = request.args.get('search', '').strip()
+    category = request.args.get('category', '').strip()
     
     # Category filtering (implement with tags in future)
-    if category and category != 'All':
-        # For now, just filter by title containing category
-        query = query.filter(Pin.title.ilike(f'%{category}%'))
-    
-    # Order by creation date
-    query = query.order_by(desc(Pin.created_at))
-    
-    # Paginate
-    pins_paginated = query.paginate(
-        page=page,
-        per_page=per_page,
-        error_out=False
-    )
+    if category == 'All':
+        category = ''
+    
+    # Full-text search, best matches first. Category terms only match titles
+    # for now.
+    if search or category:
+        query = search_pins(Pin.query, search, category)
+    else:
+        query = Pin.query.order_by(desc(Pin.created_at))
+    query = project_pins(query)
+    
+    # Keyset pagination for infinite scroll, opted into with ?cursor=. Cursor
+    # pages are always newest first, even when searching.
+    if cursor is not None:
+        pins_page = keyset_paginate(query, Pin.created_at, Pin.id, cursor, per_page)
+        return jsonify({'pins': pin_dicts(pins_page.items), **pins_page.to_dict()})
+    
+    # Paginate, the infinite scroll doesn't show totals
+    pins_paginated = offset_paginate(query, page, per_page, default_count='none')
     
     return jsonify({
-        'pins': [pin.to_dict() for pin in pins_paginated.items],
-        'page': page,
-        'pages': pins_paginated.pages,
-        'per_page': per_page,
-        'total': pins_paginated.total,
-        'has_next': pins_paginated.has_next,
-        'has_prev': pins_paginated.has_prev
+        'pins': pin_dicts(pins_paginated.items),
+        **pins_paginated.to_dict()
     })
 
 @pin_routes.route('/<int:pin_id>')
+@response_cache.cached('pin:{pin_id}')
 def get_pin(pin_id):
     """Get a specific pin"""
     pin = Pin.query.get(pin_id)
     if not pin:
         return jsonify({'error': 'Pin not found'}), 404
     
+    response_cache.tag(f'user:{pin.user_id}')
     return jsonify(pin.to_dict())
 
 @pin_routes.route('', methods=['POST'], strict_slashes=False)
@@ -84,8 +80,14 @@ def create_pin():
         )
         
         db.session.add(pin)
+        db.session.flush()
+        fan_out_pin(pin)
         db.session.commit()
         
+        response_cache.invalidate(f'user:{current_user.id}', f'boards:{current_user.id}')
+        if pin.board_id:
+            response_cache.invalidate(f'board:{pin.board_id}')
+        
         return jsonify(pin.to_dict()), 201
     
     return jsonify({'errors': form.errors}), 400
@@ -111,6 +113,7 @@ def update_pin(pin_id):
             if not board or board.user_id != current_user.id:
                 return jsonify({'error': 'Invalid board'}), 400
         
+        old_board_id = pin.board_id
         pin.title = form.title.data
         pin.description = form.description.data
         pin.image_url = form.image_url.data
@@ -119,6 +122,11 @@ def update_pin(pin_id):
         
         db.session.commit()
         
+        # Boards embed their pins and cover image, so both the old and the new
+        # board go stale
+        response_cache.invalidate(f'pin:{pin.id}', f'boards:{pin.user_id}')
+        response_cache.invalidate(*{f'board:{board_id}' for board_id in (old_board_id, pin.board_id) if board_id})
+        
         return jsonify(pin.to_dict())
     
     return jsonify({'errors': form.errors}), 400
@@ -134,9 +142,14 @@ def delete_pin(pin_id):
     if pin.user_id != current_user.id:
         return jsonify({'error': 'Unauthorized'}), 403
     
+    board_id = pin.board_id
     db.session.delete(pin)
     db.session.commit()
     
+    response_cache.invalidate(f'pin:{pin_id}', f'comments:{pin_id}', f'user:{current_user.id}', f'boards:{current_user.id}')
+    if board_id:
+        response_cache.invalidate(f'board:{board_id}')
+    
     return jsonify({'message': 'Pin deleted successfully'})
 
 @pin_routes.route('/<int:pin_id>/like', methods=['POST'])
@@ -147,26 +160,73 @@ def like_pin(pin_id):
     if not pin:
         return jsonify({'error': 'Pin not found'}), 404
     
-    existing_like = Like.query.filter_by(
-        user_id=current_user.id,
-        pin_id=pin_id
-    ).first()
+    # A toggle still in the write-behind queue is newer than the database
+    liked = write_behind.pending('like', current_user.id, pin_id)
+    if liked is None:
+        liked = Like.query.filter_by(
+            user_id=current_user.id,
+            pin_id=pin_id
+        ).first() is not None
     
-    if existing_like:
-        # Unlike the pin
-        db.session.delete(existing_like)
-        liked = False
-    else:
-        # Like the pin
-        like = Like(user_id=current_user.id, pin_id=pin_id)
-        db.session.add(like)
-        liked = True
+    # Like the pin, or unlike it if already liked
+    return _set_like(pin, not liked)
+
+@pin_routes.route('/<int:pin_id>/like', methods=['PUT'])
+@login_required
+def add_pin_like(pin_id):
+    """Like a pin, liking it again changes nothing"""
+    pin = Pin.query.get(pin_id)
+    if not pin:
+        return jsonify({'error': 'Pin not found'}), 404
     
+    return _set_like(pin, True)
+
+@pin_routes.route('/<int:pin_id>/like', methods=['DELETE'])
+@login_required
+def remove_pin_like(pin_id):
+    """Unlike a pin, unliking it again changes nothing"""
+    pin = Pin.query.get(pin_id)
+    if not pin:
+        return jsonify({'error': 'Pin not found'}), 404
+    
+    return _set_like(pin, False)
+
+def _set_like(pin, liked):
+    if write_behind.enabled:
+        # Applied (and published) by the write-behind flusher
+        likes_count = write_behind.enqueue('like', current_user.id, pin.id, liked)
+        return jsonify({'liked': liked, 'likes_count': likes_count}), 202
+    
+    # Atomic insert/delete, so concurrent double-clicks can't race into a
+    # unique_user_pin_like IntegrityError or skew likes_count
+    changed, likes_count = set_counted_row(
+        Like, liked, Pin, 'likes_count',
+        user_id=current_user.id,
+        pin_id=pin.id
+    )
     db.session.commit()
     
+    if changed:
+        response_cache.invalidate(f'pin:{pin.id}')
+        if pin.board_id:
+            response_cache.invalidate(f'board:{pin.board_id}')
+        event_streams.publish(f'pin:{pin.id}', 'likes', {'pin_id': pin.id, 'likes_count': likes_count})
+        if liked and pin.user_id != current_user.id:
+            # Notifies the pin's owner
+            event_streams.publish(f'user:{pin.user_id}', 'like', {
+                'pin_id': pin.id,
+                'user': {
+                    'id': current_user.id,
+                    'username': current_user.username,
+                    'first_name': current_user.first_name,
+                    'last_name': current_user.last_name,
+                    'avatar_url': current_user.avatar_url
+                }
+            })
+    
     return jsonify({
         'liked': liked,
-        'likes_count': len(pin.likes)
+        'likes_count': likes_count
     })
 
 @pin_routes.route('/<int:pin_id>/save', methods=['POST'])
@@ -196,88 +256,88 @@ def save_pin(pin_id):
     )
     
     db.session.add(new_pin)
+    db.session.flush()
+    fan_out_pin(new_pin)
     db.session.commit()
     
+    response_cache.invalidate(f'user:{current_user.id}', f'boards:{current_user.id}', f'board:{board_id}')
+    
     return jsonify({
         'message': 'Pin saved successfully',
         'pin': new_pin.to_dict()
     })
 
 @pin_routes.route('/user/<int:user_id>')
+@budgeted
 def get_user_pins(user_id):
     """Get all pins by a specific user"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
-    
-    pins_paginated = Pin.query.filter_by(user_id=user_id)\
-        .order_by(desc(Pin.created_at))\
-        .paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
+    cursor, page, per_page = page_args()
+    
+    if cursor is not None:
+        pins_page = keyset_paginate(project_pins(Pin.query.filter_by(user_id=user_id)), Pin.created_at, Pin.id,
+                                    cursor, per_page)
+        return jsonify({'pins': pin_dicts(pins_page.items), **pins_page.to_dict()})
+    
+    pins_query = project_pins(Pin.query.filter_by(user_id=user_id))\
+        .order_by(desc(Pin.created_at))
+    pins_paginated = offset_paginate(pins_query, page, per_page)
     
     return jsonify({
-        'pins': [pin.to_dict() for pin in pins_paginated.items],
-        'page': page,
-        'pages': pins_paginated.pages,
-        'per_page': per_page,
-        'total': pins_paginated.total,
-        'has_next': pins_paginated.has_next,
-        'has_prev': pins_paginated.has_prev
+        'pins': pin_dicts(pins_paginated.items),
+        **pins_paginated.to_dict()
     })
 
+def _liked_pins_page(user_id, cursor, per_page):
+    """Keyset page of a user's liked pins, newest like first"""
+    query = project_pins(
+        Pin.query.join(Like, Pin.id == Like.pin_id).filter(Like.user_id == user_id),
+        Like.created_at.label('liked_at'), Like.id.label('like_id')
+    )
+    
+    pins_page = keyset_paginate(
+        query, Like.created_at, Like.id, cursor, per_page,
+        key=lambda row: (row.liked_at, row.like_id)
+    )
+    
+    return {'pins': pin_dicts(pins_page.items), **pins_page.to_dict()}
+
 @pin_routes.route('/liked')
 @login_required
+@budgeted
 def get_liked_pins():
     """Get pins liked by the current user"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    cursor, page, per_page = page_args()
+    
+    if cursor is not None:
+        return jsonify(_liked_pins_page(current_user.id, cursor, per_page))
     
     # Join pins with likes table to get liked pins
-    pins_paginated = Pin.query\
-        .join(Like, Pin.id == Like.pin_id)\
+    pins_query = project_pins(Pin.query.join(Like, Pin.id == Like.pin_id))\
         .filter(Like.user_id == current_user.id)\
-        .order_by(desc(Like.created_at))\
-        .paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
+        .order_by(desc(Like.created_at))
+    pins_paginated = offset_paginate(pins_query, page, per_page)
     
     return jsonify({
-        'pins': [pin.to_dict() for pin in pins_paginated.items],
-        'page': page,
-        'pages': pins_paginated.pages,
-        'per_page': per_page,
-        'total': pins_paginated.total,
-        'has_next': pins_paginated.has_next,
-        'has_prev': pins_paginated.has_prev
+        'pins': pin_dicts(pins_paginated.items),
+        **pins_paginated.to_dict()
     })
 
 @pin_routes.route('/user/<int:user_id>/liked')
+@budgeted
 def get_user_liked_pins(user_id):
     """Get pins liked by a specific user (public)"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    cursor, page, per_page = page_args()
+    
+    if cursor is not None:
+        return jsonify(_liked_pins_page(user_id, cursor, per_page))
     
     # Join pins with likes table to get liked pins
-    pins_paginated = Pin.query\
-        .join(Like, Pin.id == Like.pin_id)\
+    pins_query = project_pins(Pin.query.join(Like, Pin.id == Like.pin_id))\
         .filter(Like.user_id == user_id)\
-        .order_by(desc(Like.created_at))\
-        .paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
+        .order_by(desc(Like.created_at))
+    pins_paginated = offset_paginate(pins_query, page, per_page)
     
     return jsonify({
-        'pins': [pin.to_dict() for pin in pins_paginated.items],
-        'page': page,
-        'pages': pins_paginated.pages,
-        'per_page': per_page,
-        'total': pins_paginated.total,
-        'has_next': pins_paginated.has_next,
-        'has_prev': pins_paginated.has_prev
+        'pins': pin_dicts(pins_paginated.items),
+        **pins_paginated.to_dict()
     })
\ No newline at end of file
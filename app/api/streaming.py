@@ -0,0 +1,67 @@
+from itertools import chain, islice
+from flask import current_app, jsonify, request, stream_with_context, Response
+
+
+# Rows fetched per round trip, and the size under which a collection is
+# answered with a regular (cacheable) response instead of a stream
+STREAM_BATCH_SIZE = 500
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_ndjson():
+    """True if the client asked for newline-delimited JSON"""
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def stream_collection(key, query, serialize, batch_size=STREAM_BATCH_SIZE, on_batch=None):
+    """
+    Answers with every row of query as {key: [...]}, or as one JSON object
+    per line when the client accepts application/x-ndjson.
+
+    Rows are fetched batch_size at a time with yield_per and serialize turns
+    each batch into a list of dicts, so batches can load their related rows
+    in bulk. A collection that fits in one batch gets an ordinary response;
+    anything larger is streamed, so memory stays flat however many rows
+    there are. on_batch, if given, is called with each batch before it is
+    serialized.
+    """
+    batches = _batches(query.yield_per(batch_size), batch_size)
+    first = next(batches, [])
+    second = next(batches, None)
+
+    def items(batches):
+        for batch in batches:
+            if on_batch is not None:
+                on_batch(batch)
+            yield from serialize(batch)
+
+    # Compact like jsonify, so small and streamed responses look the same
+    def dumps(value):
+        return current_app.json.dumps(value, separators=(',', ':'))
+
+    if wants_ndjson():
+        lines = (dumps(item) + '\n' for item in items(chain([first], [second] if second else [], batches)))
+        if second is None:
+            return Response(''.join(lines), mimetype=NDJSON_MIMETYPE)
+        return Response(stream_with_context(lines), mimetype=NDJSON_MIMETYPE)
+
+    if second is None:
+        return jsonify({key: list(items([first]))})
+
+    def generate():
+        yield '{' + dumps(key) + ':['
+        for position, item in enumerate(items(chain([first, second], batches))):
+            yield (',' if position else '') + dumps(item)
+        yield ']}\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
@@ -1,18 +1,23 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
-from app.models import db, User, Follow, Pin, Board
+from app.models import db, User, Follow, Pin, Board, backfill_follow, retract_follow, feed_query, set_counted_row, \
+    project_users, user_dicts, project_pins, pin_dicts, project_boards, board_dicts
 from app.forms import UserUpdateForm
-from sqlalchemy import desc, or_
+from app.api.pagination import keyset_paginate, offset_paginate, page_args, budgeted
+from app.api.streaming import stream_collection
+from app.cache import response_cache, user_cache
+from app.write_behind import write_behind
+from sqlalchemy import desc
 
 user_routes = Blueprint('users', __name__)
 
 @user_routes.route('/')
 def users():
-    """Query for all users and return them in a list of user dictionaries"""
-    users = User.query.all()
-    return jsonify({'users': [user.to_dict() for user in users]})
+    """Stream every user as a list of user dictionaries"""
+    return stream_collection('users', project_users(User.query.order_by(User.id)), user_dicts)
 
 @user_routes.route('/<int:id>')
+@response_cache.cached('user:{id}')
 def user(id):
     """Query for a user by id and return that user in a dictionary"""
     user = User.query.get(id)
@@ -44,6 +49,8 @@ def update_user(id):
         user.avatar_url = form.avatar_url.data
         
         db.session.commit()
+        response_cache.invalidate(f'user:{id}')
+        user_cache.refresh(user)
         return jsonify(user.to_dict(include_stats=True, include_private=True))
     
     return jsonify({'errors': form.errors}), 400
@@ -59,26 +66,68 @@ def follow_user(user_id):
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    existing_follow = Follow.query.filter_by(
+    # A toggle still in the write-behind queue is newer than the database
+    following = write_behind.pending('follow', current_user.id, user_id)
+    if following is None:
+        following = Follow.query.filter_by(
+            follower_id=current_user.id,
+            followed_id=user_id
+        ).first() is not None
+    
+    # Follow the user, or unfollow them if already following
+    return _set_follow(user, not following)
+
+@user_routes.route('/<int:user_id>/follow', methods=['PUT'])
+@login_required
+def add_user_follow(user_id):
+    """Follow a user, following them again changes nothing"""
+    if current_user.id == user_id:
+        return jsonify({'error': 'Cannot follow yourself'}), 400
+    
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    return _set_follow(user, True)
+
+@user_routes.route('/<int:user_id>/follow', methods=['DELETE'])
+@login_required
+def remove_user_follow(user_id):
+    """Unfollow a user, unfollowing them again changes nothing"""
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    return _set_follow(user, False)
+
+def _set_follow(user, following):
+    if write_behind.enabled:
+        # Applied (feeds included) by the write-behind flusher
+        followers_count = write_behind.enqueue('follow', current_user.id, user.id, following)
+        return jsonify({'following': following, 'followers_count': followers_count}), 202
+    
+    # Atomic insert/delete, so concurrent toggles can't race into a
+    # unique_follow IntegrityError or skew the follower counts
+    changed, followers_count = set_counted_row(
+        Follow, following, User, 'followers_count',
         follower_id=current_user.id,
-        followed_id=user_id
-    ).first()
+        followed_id=user.id
+    )
     
-    if existing_follow:
-        # Unfollow the user
-        db.session.delete(existing_follow)
-        following = False
-    else:
-        # Follow the user
-        follow = Follow(follower_id=current_user.id, followed_id=user_id)
-        db.session.add(follow)
-        following = True
+    # Only the request that really changed the follow touches the feed
+    if changed and following:
+        backfill_follow(current_user.id, user)
+    elif changed:
+        retract_follow(current_user.id, user.id)
     
     db.session.commit()
     
+    if changed:
+        response_cache.invalidate(f'user:{current_user.id}', f'user:{user.id}')
+    
     return jsonify({
         'following': following,
-        'followers_count': len(user.followers)
+        'followers_count': followers_count
     })
 
 @user_routes.route('/<int:user_id>/follow-status', methods=['GET'])
@@ -99,74 +148,59 @@ def get_follow_status(user_id):
     
     return jsonify({
         'following': existing_follow is not None,
-        'followers_count': len(user.followers)
+        'followers_count': user.followers_count
     })
 
 @user_routes.route('/feed')
 @login_required
+@budgeted
 def get_user_feed():
     """Get personalized feed for current user"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    cursor, page, per_page = page_args()
     
-    # Get pins from users that current user follows
-    followed_user_ids = db.session.query(Follow.followed_id)\
-        .filter(Follow.follower_id == current_user.id).all()
-    followed_user_ids = [id[0] for id in followed_user_ids]
-    
-    if not followed_user_ids:
+    if not current_user.following_count:
         # If not following anyone, show recent pins
         pins_query = Pin.query.order_by(desc(Pin.created_at))
+        sort_keys = (Pin.created_at, Pin.id)
     else:
-        # Show pins from followed users + some random recent pins
-        pins_query = Pin.query.filter(
-            or_(
-                Pin.user_id.in_(followed_user_ids)
-            )
-        ).order_by(desc(Pin.created_at))
-    
-    pins_paginated = pins_query.paginate(
-        page=page,
-        per_page=per_page,
-        error_out=False
-    )
+        # Show the materialized feed of pins from followed users
+        pins_query, sort_keys = feed_query(current_user.id)
+    pins_query = project_pins(pins_query)
+    
+    if cursor is not None:
+        pins_page = keyset_paginate(pins_query, *sort_keys, cursor, per_page)
+        return jsonify({'pins': pin_dicts(pins_page.items), **pins_page.to_dict()})
+    
+    # The feed is scrolled, not paged through, so nothing is counted
+    pins_paginated = offset_paginate(pins_query, page, per_page, default_count='none')
     
     return jsonify({
-        'pins': [pin.to_dict() for pin in pins_paginated.items],
-        'page': page,
-        'pages': pins_paginated.pages,
-        'per_page': per_page,
-        'total': pins_paginated.total,
-        'has_next': pins_paginated.has_next,
-        'has_prev': pins_paginated.has_prev
+        'pins': pin_dicts(pins_paginated.items),
+        **pins_paginated.to_dict()
     })
 
 @user_routes.route('/<int:user_id>/pins')
+@budgeted
 def get_user_pins(user_id):
     """Get all pins by a specific user"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    cursor, page, per_page = page_args()
     
     user = User.query.get(user_id)
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    pins_paginated = Pin.query.filter_by(user_id=user_id)\
-        .order_by(desc(Pin.created_at))\
-        .paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
+    if cursor is not None:
+        pins_page = keyset_paginate(project_pins(Pin.query.filter_by(user_id=user_id)), Pin.created_at, Pin.id,
+                                    cursor, per_page)
+        return jsonify({'pins': pin_dicts(pins_page.items), **pins_page.to_dict()})
+    
+    pins_query = project_pins(Pin.query.filter_by(user_id=user_id))\
+        .order_by(desc(Pin.created_at))
+    pins_paginated = offset_paginate(pins_query, page, per_page)
     
     return jsonify({
-        'pins': [pin.to_dict() for pin in pins_paginated.items],
-        'page': page,
-        'pages': pins_paginated.pages,
-        'per_page': per_page,
-        'total': pins_paginated.total,
-        'has_next': pins_paginated.has_next,
-        'has_prev': pins_paginated.has_prev
+        'pins': pin_dicts(pins_paginated.items),
+        **pins_paginated.to_dict()
     })
 
 @user_routes.route('/<int:user_id>/boards')
@@ -177,9 +211,9 @@ def get_user_boards(user_id):
         return jsonify({'error': 'User not found'}), 404
     
     # Only show public boards unless it's the user's own profile
-    if current_user and current_user.id == user_id:
-        boards = Board.query.filter_by(user_id=user_id).all()
+    if current_user.is_authenticated and current_user.id == user_id:
+        boards = Board.query.filter_by(user_id=user_id)
     else:
-        boards = Board.query.filter_by(user_id=user_id, is_private=False).all()
+        boards = Board.query.filter_by(user_id=user_id, is_private=False)
     
-    return jsonify([board.to_dict(include_pins=True) for board in boards])
+    return jsonify(board_dicts(project_boards(boards).all(), include_pins=True))
@@ -0,0 +1,347 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+from flask import g, request, make_response, session
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from app.models import db, User
+
+
+class CacheCounters:
+    """Hit and miss counts of a cache, read by instrumentation.watch_cache"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+class MemoryCache:
+    """Thread-safe TTL + LRU cache local to one process"""
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[0] is not None and entry[0] < time.monotonic()):
+                self._entries.pop(key, None)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileCache:
+    """
+    TTL cache stored as one file per key in a directory, so every gunicorn
+    worker on the host shares entries and invalidations. Reads refresh the
+    file's mtime and the least recently used files are pruned past
+    max_entries.
+    """
+
+    PRUNE_EVERY = 64
+
+    def __init__(self, directory, max_entries=4096, ttl=60):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl else None
+        # Write to a temp file and rename so readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((expires, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def _prune(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.startswith('.tmp-'):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    pass
+        for _, path in sorted(entries)[:max(len(entries) - self.max_entries, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class NullCache:
+    """Backend that stores nothing, for disabling the response cache"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class ResponseCache:
+    """
+    Caches the responses of public GET endpoints and serves conditional GETs.
+
+    Every entry is stored with the current token of each of its tags (like
+    'pin:3' or 'user:7'). Write handlers call invalidate() with the tags they
+    affected, which gives those tags new tokens, so any entry rendered before
+    the write no longer matches and is rebuilt on the next request.
+    """
+
+    def __init__(self, app=None):
+        self.backend = NullCache()
+        self.counters = CacheCounters()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('RESPONSE_CACHE_BACKEND', 'memory')
+        ttl = app.config.get('RESPONSE_CACHE_TTL', 60)
+        max_entries = app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1024)
+        if backend == 'memory':
+            self.backend = MemoryCache(max_entries=max_entries, ttl=ttl)
+        elif backend == 'file':
+            directory = app.config.get('RESPONSE_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'myday-cache')
+            self.backend = FileCache(directory, max_entries=max_entries, ttl=ttl)
+        else:
+            self.backend = NullCache()
+        app.extensions['response_cache'] = self
+
+    def _tag_token(self, tag):
+        # A tag that was never seen (or was evicted) gets a fresh token, which
+        # only ever turns entries stored under the old one into misses
+        token = self.backend.get(f'tag:{tag}')
+        if token is None:
+            token = uuid.uuid4().hex
+            self.backend.set(f'tag:{tag}', token, ttl=0)
+        return token
+
+    def invalidate(self, *tags):
+        """Expires every cached response carrying any of the given tags"""
+        for tag in tags:
+            self.backend.set(f'tag:{tag}', uuid.uuid4().hex, ttl=0)
+
+    def tag(self, *tags):
+        """Adds tags to the response being built by the current view"""
+        tokens = g.setdefault('response_cache_tags', {})
+        for tag in tags:
+            if tag not in tokens:
+                tokens[tag] = self._tag_token(tag)
+
+    def skip(self):
+        """Keeps the current view's response out of the cache, e.g. private data"""
+        g.response_cache_skip = True
+
+    def _conditional(self, response, entry):
+        response.set_etag(entry['etag'])
+        response.last_modified = entry['last_modified']
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    def cached(self, *tag_templates):
+        """
+        Decorator for GET views. Tag templates are formatted with the view
+        arguments, e.g. @response_cache.cached('pin:{pin_id}').
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                # Accept is part of the key, some views answer NDJSON too
+                key = 'response:{}:{}?{}:{}'.format(
+                    request.endpoint,
+                    sorted(kwargs.items()),
+                    sorted(request.args.items(multi=True)),
+                    request.accept_mimetypes
+                )
+
+                entry = self.backend.get(key)
+                hit = entry is not None and all(
+                    self.backend.get(f'tag:{tag}') == token for tag, token in entry['tags'].items()
+                )
+                self.counters.count(hit)
+                if hit:
+                    response = make_response(entry['body'], entry['status'])
+                    response.mimetype = entry['mimetype']
+                    return self._conditional(response, entry)
+
+                # Tokens are read before rendering, so a write that lands while
+                # the view runs leaves this entry already invalidated
+                tags = {template.format(**kwargs) for template in tag_templates}
+                tokens = {tag: self._tag_token(tag) for tag in tags}
+
+                response = make_response(view(**kwargs))
+                if response.status_code != 200 or response.is_streamed or g.get('response_cache_skip'):
+                    return response
+
+                for tag, token in g.get('response_cache_tags', {}).items():
+                    tokens.setdefault(tag, token)
+                entry = {
+                    'body': response.get_data(),
+                    'status': response.status_code,
+                    'mimetype': response.mimetype,
+                    'etag': hashlib.sha1(response.get_data()).hexdigest(),
+                    'last_modified': datetime.now(timezone.utc).replace(microsecond=0),
+                    'tags': tokens
+                }
+                self.backend.set(key, entry)
+                return self._conditional(response, entry)
+            return wrapper
+        return decorator
+
+
+class UserCache:
+    """
+    Per-process cache of the logged in user, so load_user doesn't query the
+    database on every authenticated request.
+
+    Entries hold the user's profile columns. The denormalized counters are
+    left out, they change without touching updated_at and load on first
+    access. Each entry is stamped with the user's updated_at and the session
+    remembers the stamp it last loaded, so a session only reuses an entry
+    matching its own view of the user. refresh() restamps both after the
+    user is updated, entries also expire after USER_CACHE_TTL seconds.
+    """
+
+    COUNTERS = ('pins_count', 'boards_count', 'followers_count', 'following_count')
+
+    def __init__(self, app=None):
+        self.backend = NullCache()
+        self.counters = CacheCounters()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config.get('USER_CACHE_ENABLED', True):
+            self.backend = MemoryCache(
+                max_entries=app.config.get('USER_CACHE_MAX_ENTRIES', 1024),
+                ttl=app.config.get('USER_CACHE_TTL', 30)
+            )
+        else:
+            self.backend = NullCache()
+        app.extensions['user_cache'] = self
+
+    @staticmethod
+    def _version(user):
+        return f'{user.id}:{user.updated_at}'
+
+    def _store(self, user):
+        mapper = inspect(user).mapper
+        columns = {
+            attr.key: getattr(user, attr.key)
+            for attr in mapper.column_attrs if attr.key not in self.COUNTERS
+        }
+        self.backend.set(user.id, (self._version(user), columns))
+        if session.get('user_version') != self._version(user):
+            session['user_version'] = self._version(user)
+
+    def load(self, user_id):
+        """Returns the user, attached to db.session, or None"""
+        entry = self.backend.get(user_id)
+        # An entry of another version of the user is reloaded, so it's a miss
+        hit = entry is not None and entry[0] == session.get('user_version')
+        self.counters.count(hit)
+        if hit:
+            # merge(load=False) attaches a copy without querying, the
+            # attributes left out of the entry load when first used
+            user = User(**entry[1])
+            make_transient_to_detached(user)
+            return db.session.merge(user, load=False)
+
+        user = db.session.get(User, user_id)
+        if user is not None:
+            self._store(user)
+        return user
+
+    def refresh(self, user):
+        """Replaces the cached copy of a user after it was updated"""
+        self.backend.delete(user.id)
+        self._store(user)
+
+    def forget(self):
+        """Drops the session's stamp when its user logs out"""
+        session.pop('user_version', None)
+
+
+response_cache = ResponseCache()
+user_cache = UserCache()
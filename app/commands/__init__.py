@@ -0,0 +1,114 @@
+from flask.cli import AppGroup
+from sqlalchemy import text
+from app.models import db, replica_router, reconcile_counters, rebuild_feeds, trim_feeds
+from app.write_behind import write_behind
+from .perf import perf_commands
+from .bench import bench_commands
+
+# Creates a counters group to hold our maintenance commands
+# So we can type `flask counters --help`
+counter_commands = AppGroup('counters')
+
+
+# Creates the `flask counters reconcile` command
+@counter_commands.command('reconcile')
+def reconcile():
+    """Recompute denormalized like/comment/pin/follower counters"""
+    repaired = reconcile_counters()
+    for counter, rows in repaired.items():
+        print(f"{counter}: {rows} row(s) repaired")
+
+
+
+# Creates a feed group, `flask feed --help`
+feed_commands = AppGroup('feed')
+
+
+# Creates the `flask feed rebuild` command
+@feed_commands.command('rebuild')
+def rebuild():
+    """Rebuild every materialized home feed from follows and pins"""
+    rebuild_feeds()
+    print("Home feeds rebuilt")
+
+
+# Creates the `flask feed trim` command
+@feed_commands.command('trim')
+def trim():
+    """Cut every home feed back to its newest FEED_MAX_LENGTH pins"""
+    trim_feeds()
+    print("Home feeds trimmed")
+
+
+# Creates a replicas group, `flask replicas --help`
+replica_commands = AppGroup('replicas')
+
+
+# Creates the `flask replicas status` command
+@replica_commands.command('status')
+def replica_status():
+    """Show the configured read replicas and whether they are reachable"""
+    if not replica_router.replicas:
+        print("No read replicas configured (DATABASE_REPLICA_URLS)")
+        return
+    print(f"Selection: {replica_router.selection}, "
+          f"read-your-writes window: {replica_router.sticky_seconds}s")
+    for key in replica_router.replicas:
+        engine = db.engines[key]
+        try:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+            state = 'ok'
+        except Exception as error:
+            state = f'unreachable ({error.__class__.__name__})'
+        print(f"{key}: {engine.url.render_as_string(hide_password=True)} {state}")
+
+
+# Creates the `flask replicas sync` command
+@replica_commands.command('sync')
+def replica_sync():
+    """Copy the primary SQLite database to SQLite replicas, for local testing"""
+    if db.engine.dialect.name != 'sqlite':
+        print("Only SQLite replicas can be synced, real replicas use database replication")
+        return
+    primary = db.engine.raw_connection()
+    try:
+        for key in replica_router.replicas:
+            engine = db.engines[key]
+            if engine.dialect.name != 'sqlite':
+                print(f"{key}: skipped, not SQLite")
+                continue
+            replica = engine.raw_connection()
+            try:
+                primary.driver_connection.backup(replica.driver_connection)
+            finally:
+                replica.close()
+            print(f"{key}: synced")
+    finally:
+        primary.close()
+
+
+# Creates a write-behind group, `flask write-behind --help`
+write_behind_commands = AppGroup('write-behind')
+
+
+# Creates the `flask write-behind status` command
+@write_behind_commands.command('status')
+def write_behind_status():
+    """Show how many like and follow toggles are waiting in the write-behind queue"""
+    queued, age, failed = write_behind.status()
+    state = 'enabled' if write_behind.enabled else 'disabled'
+    print(f"Write-behind {state} ({write_behind.path}): {queued} toggle(s) queued, oldest {age:.1f}s")
+    if failed:
+        print(f"{failed} toggle(s) failed to apply, see the failed_toggles table")
+
+
+# Creates the `flask write-behind flush` command
+@write_behind_commands.command('flush')
+def write_behind_flush():
+    """Apply every queued toggle now, also after write-behind was disabled"""
+    applied = write_behind.flush()
+    if applied is None:
+        print("Another process is flushing the queue, try again")
+    else:
+        print(f"{applied} toggle(s) applied")
@@ -0,0 +1,329 @@
+import json
+import random
+import re
+import subprocess
+import threading
+import time
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import event, func
+from app.cache import response_cache, NullCache
+from app.models import db, User, Pin, Board
+from app.seeds.synthetic import WORDS
+
+# Creates a bench group to hold our load tests
+# So we can type `flask bench --help`
+bench_commands = AppGroup('bench')
+
+
+# How often each scenario is picked by the mixed workload
+MIXED_WEIGHTS = {
+    'feed': 35,
+    'browse': 25,
+    'search': 15,
+    'likes': 15,
+    'comments': 7,
+    'auth': 3,
+}
+# Like storms all hit this many pins, to provoke contention on them
+HOT_PINS = 10
+SAMPLE_SIZE = 500
+
+
+# The JSON encoding time reported by the instrumentation's Server-Timing header
+SERIALIZE_TIMING = re.compile(r'serialize;dur=([0-9.]+)')
+
+
+def _serialize_seconds(response):
+    match = SERIALIZE_TIMING.search(response.headers.get('Server-Timing', ''))
+    return float(match.group(1)) / 1000 if match else 0.0
+
+
+class Recorder:
+    """Collects latency, query count and serialization time samples per endpoint, across threads"""
+
+    def __init__(self):
+        self.samples = {}
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def count_query(self, *args):
+        if getattr(self._local, 'queries', None) is not None:
+            self._local.queries += 1
+
+    def request(self, client, label, method, url, **kwargs):
+        self._local.queries = 0
+        start = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        elapsed = time.perf_counter() - start
+        queries, self._local.queries = self._local.queries, None
+
+        if self.enabled:
+            with self._lock:
+                self.samples.setdefault(label, []).append(
+                    (elapsed, queries, response.status_code, _serialize_seconds(response))
+                )
+        return response
+
+
+class VirtualUser:
+    """One logged-in browser session driving scenarios through the test client"""
+
+    def __init__(self, recorder, dataset, user, seed):
+        self.recorder = recorder
+        self.dataset = dataset
+        self.user_id, self.email = user
+        self.rng = random.Random(seed)
+        self.client = current_app.test_client()
+        token = self.client.get('/api/csrf/restore').get_json()['csrf_token']
+        self.headers = {'X-CSRFToken': token}
+        self.login()
+
+    def get(self, label, url):
+        return self.recorder.request(self.client, label, 'GET', url)
+
+    def send(self, label, method, url, json=None):
+        return self.recorder.request(self.client, label, method, url, json=json, headers=self.headers)
+
+    def login(self):
+        return self.send('POST /api/auth/login', 'POST', '/api/auth/login', {'email': self.email, 'password': 'password'})
+
+    def pick(self, name):
+        return self.rng.choice(self.dataset[name])
+
+    def feed(self):
+        """Scrolls the home feed and the explore page a few pages deep"""
+        for label, url in [
+            ('GET /api/users/feed', '/api/users/feed?per_page=20&cursor='),
+            ('GET /api/pins', '/api/pins?per_page=20&cursor='),
+        ]:
+            for _ in range(self.rng.randint(1, 5)):
+                page = self.get(label, url).get_json() or {}
+                if not page.get('has_next'):
+                    break
+                url = url.split('&cursor=')[0] + '&cursor=' + page['next_cursor']
+
+    def browse(self):
+        """Opens a pin, its author's profile and one of their boards"""
+        pin_id, user_id, board_id = self.pick('pins'), self.pick('users')[0], self.pick('boards')
+        self.get('GET /api/pins/<id>', f'/api/pins/{pin_id}')
+        self.get('GET /api/comments/pin/<id>', f'/api/comments/pin/{pin_id}')
+        self.get('GET /api/users/<id>', f'/api/users/{user_id}')
+        self.get('GET /api/users/<id>/pins', f'/api/users/{user_id}/pins')
+        self.get('GET /api/users/<id>/boards', f'/api/users/{user_id}/boards')
+        self.get('GET /api/boards/user/<id>', f'/api/boards/user/{user_id}')
+        self.get('GET /api/boards/<id>', f'/api/boards/{board_id}')
+        self.get('GET /api/boards/<id>/pins', f'/api/boards/{board_id}/pins')
+
+    def search(self):
+        terms = ' '.join(self.rng.sample(WORDS, self.rng.randint(1, 2)))
+        self.get('GET /api/pins?search', f'/api/pins?search={terms}')
+        self.get('GET /api/pins?category', f'/api/pins?category={self.rng.choice(WORDS)}')
+
+    def likes(self):
+        """Hammers a handful of hot pins with likes and unlikes"""
+        pin_id = self.rng.choice(self.dataset['pins'][:HOT_PINS])
+        self.send('PUT /api/pins/<id>/like', 'PUT', f'/api/pins/{pin_id}/like')
+        self.send('POST /api/pins/<id>/like', 'POST', f'/api/pins/{pin_id}/like')
+        self.send('DELETE /api/pins/<id>/like', 'DELETE', f'/api/pins/{pin_id}/like')
+        self.get('GET /api/pins/<id>', f'/api/pins/{pin_id}')
+
+    def comments(self):
+        """Reads a comment thread, then adds, edits and removes a comment"""
+        pin_id = self.pick('pins')
+        self.get('GET /api/comments/pin/<id>', f'/api/comments/pin/{pin_id}')
+        response = self.send('POST /api/comments', 'POST', '/api/comments', {'pin_id': pin_id, 'content': 'Love this idea!'})
+        if response.status_code != 201:
+            # Users can't comment on their own pins
+            return
+        comment_id = response.get_json()['id']
+        self.get('GET /api/comments/pin/<id>', f'/api/comments/pin/{pin_id}')
+        self.send('PUT /api/comments/<id>', 'PUT', f'/api/comments/{comment_id}', {'content': 'Love this idea, saving it!'})
+        self.send('DELETE /api/comments/<id>', 'DELETE', f'/api/comments/{comment_id}')
+
+    def auth(self):
+        self.get('GET /api/auth', '/api/auth/')
+        self.get('GET /api/auth/logout', '/api/auth/logout')
+        self.login()
+
+
+def _load_dataset(rng):
+    """Samples rows to drive the scenarios from, the same ones for a given seed"""
+    def sample(model, *columns, where=True):
+        max_id = db.session.query(func.max(model.id)).scalar() or 0
+        ids = rng.sample(range(1, max_id + 1), min(SAMPLE_SIZE, max_id))
+        rows = db.session.query(*columns).filter(model.id.in_(ids), where).order_by(model.id).all()
+        rng.shuffle(rows)
+        return [tuple(row) if len(row) > 1 else row[0] for row in rows]
+
+    dataset = {
+        'users': sample(User, User.id, User.email),
+        'pins': sample(Pin, Pin.id),
+        'boards': sample(Board, Board.id, where=Board.is_private.is_(False)),
+    }
+    for name, rows in dataset.items():
+        if not rows:
+            raise click.ClickException(f'No {name} in the database, seed it first (flask seed all / synthetic)')
+    return dataset
+
+
+def _percentile(sorted_values, percent):
+    # Nearest-rank percentile
+    index = max(int(round(percent / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def _summarize(samples, wall_time):
+    latencies = sorted(sample[0] for sample in samples)
+    statuses = {}
+    for sample in samples:
+        statuses[str(sample[2])] = statuses.get(str(sample[2]), 0) + 1
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample[2] >= 500),
+        'statuses': statuses,
+        'throughput_rps': round(len(samples) / wall_time, 2),
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2),
+        'queries_per_request': round(sum(sample[1] for sample in samples) / len(samples), 2),
+        # Share of the request time spent encoding JSON
+        'serialize_pct': round(sum(sample[3] for sample in samples) / sum(latencies) * 100, 1),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(workload='mixed', iterations=200, concurrency=4, warmup=20, seed=0):
+    """
+    Runs `iterations` scenarios of the workload spread over `concurrency`
+    threads, each a logged-in virtual user, and returns the results.
+    """
+    rng = random.Random(seed)
+    dataset = _load_dataset(rng)
+    scenarios = list(MIXED_WEIGHTS) if workload == 'mixed' else [workload]
+    weights = [MIXED_WEIGHTS[scenario] for scenario in scenarios]
+
+    recorder = Recorder()
+    event.listen(db.engine, 'before_cursor_execute', recorder.count_query)
+    app = current_app._get_current_object()
+    errors = []
+
+    def worker(index, runs):
+        try:
+            with app.app_context():
+                worker_rng = random.Random(seed * 1000 + index)
+                user = VirtualUser(recorder, dataset, dataset['users'][index % len(dataset['users'])], worker_rng.random())
+                for _ in range(runs):
+                    getattr(user, worker_rng.choices(scenarios, weights)[0])()
+        except Exception as e:
+            errors.append(e)
+
+    try:
+        # Warm up caches and connections without recording
+        recorder.enabled = False
+        worker(concurrency, warmup)
+        recorder.enabled = True
+
+        threads = [
+            threading.Thread(target=worker, args=(index, iterations // concurrency + (index < iterations % concurrency)))
+            for index in range(concurrency)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_time = time.perf_counter() - start
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', recorder.count_query)
+    if errors:
+        raise errors[0]
+
+    all_samples = [sample for samples in recorder.samples.values() for sample in samples]
+    return {
+        'meta': {
+            'revision': _git_revision(),
+            'started_at': datetime.utcnow().isoformat(),
+            'database': db.engine.dialect.name,
+            'workload': workload,
+            'iterations': iterations,
+            'concurrency': concurrency,
+            'seed': seed,
+            'response_cache': type(response_cache.backend).__name__,
+            'wall_time_s': round(wall_time, 3),
+        },
+        'total': _summarize(all_samples, wall_time),
+        'endpoints': {
+            label: _summarize(samples, wall_time)
+            for label, samples in sorted(recorder.samples.items())
+        },
+    }
+
+
+def _print_results(results):
+    columns = ['requests', 'errors', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request',
+               'serialize_pct']
+    click.echo(f'{"endpoint":<32}' + ''.join(f'{column:>20}' for column in columns))
+    for label, stats in [*results['endpoints'].items(), ('TOTAL', results['total'])]:
+        click.echo(f'{label:<32}' + ''.join(f'{stats[column]:>20}' for column in columns))
+
+
+# Creates the `flask bench run` command
+@bench_commands.command('run')
+@click.option('--workload', default='mixed', show_default=True, type=click.Choice(['mixed', *MIXED_WEIGHTS]))
+@click.option('--iterations', default=200, show_default=True, help='Scenarios to run in total.')
+@click.option('--concurrency', default=4, show_default=True, help='Virtual users running in parallel.')
+@click.option('--warmup', default=20, show_default=True, help='Unrecorded scenarios run first.')
+@click.option('--seed', default=0, show_default=True, help='Random seed for the scenario mix.')
+@click.option('--cache/--no-cache', default=True, show_default=True, help='Keep the response cache enabled.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Save the results as JSON.')
+def run(workload, iterations, concurrency, warmup, seed, cache, output):
+    """Load test the API with a realistic workload against the current database"""
+    if not cache:
+        response_cache.backend = NullCache()
+    results = run_benchmark(workload, iterations, concurrency, warmup, seed)
+    _print_results(results)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        click.echo(f'Results saved to {output}')
+
+
+# Creates the `flask bench compare` command
+@bench_commands.command('compare')
+@click.argument('baseline', type=click.File())
+@click.argument('candidate', type=click.File())
+@click.option('--threshold', default=0.2, show_default=True, help='Allowed relative p95 and queries/request increase.')
+def compare(baseline, candidate, threshold):
+    """Compare two saved runs, failing if an endpoint regressed"""
+    baseline, candidate = json.load(baseline), json.load(candidate)
+    regressions = []
+    click.echo(f'{"endpoint":<32}{"p95 ms":>24}{"change":>10}{"queries/request":>24}')
+    for label, new in sorted(candidate['endpoints'].items()):
+        old = baseline['endpoints'].get(label)
+        if old is None:
+            click.echo(f'{label:<32}{"new":>24}')
+            continue
+        change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] if old['p95_ms'] else 0
+        queries = f'{old["queries_per_request"]} -> {new["queries_per_request"]}'
+        click.echo(f'{label:<32}{old["p95_ms"]:>11} -> {new["p95_ms"]:<9}{change:>+10.0%}{queries:>24}')
+        # More queries per request is a regression too (an N+1 sneaking in)
+        if change > threshold or new['queries_per_request'] > old['queries_per_request'] * (1 + threshold):
+            regressions.append(label)
+
+    if regressions:
+        click.echo(f'Regressed: {", ".join(regressions)}', err=True)
+        raise SystemExit(1)
@@ -0,0 +1,212 @@
+import json
+import re
+import statistics
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import desc, event, func
+from sqlalchemy.orm import joinedload
+from app.models import db, User, Pin, Board, Like, Comment, project_users, user_dicts, project_pins, pin_dicts, \
+    project_comments, comment_dicts, project_boards, board_dicts
+
+# Creates a perf group to hold our performance checks
+# So we can type `flask perf --help`
+perf_commands = AppGroup('perf')
+
+
+# The hot read paths of pin_routes, board_routes and user_routes. Placeholders
+# are filled with ids from the current database.
+HOT_ENDPOINTS = [
+    '/api/pins?per_page=20',
+    '/api/pins?per_page=20&cursor=',
+    '/api/pins?search=home',
+    '/api/pins/{pin_id}',
+    '/api/pins/user/{user_id}',
+    '/api/pins/user/{user_id}/liked',
+    '/api/pins/liked',
+    '/api/boards',
+    '/api/boards/{board_id}',
+    '/api/boards/{board_id}/pins',
+    '/api/boards/user/{user_id}',
+    '/api/boards/following',
+    '/api/users/{user_id}',
+    '/api/users/{user_id}/pins',
+    '/api/users/{user_id}/boards',
+    '/api/users/feed',
+    '/api/users/feed?cursor=',
+]
+
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+def _capture_selects(client, url):
+    """Runs a request and returns every SELECT it sent to the database"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return response.status_code, statements
+
+
+def _sqlite_full_scans(connection, statement, parameters, tables):
+    plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    scans = []
+    for row in plan:
+        match = SQLITE_FULL_SCAN.match(row[-1])
+        if match and match.group(1) in tables:
+            scans.append(match.group(1))
+    return scans
+
+
+def _postgres_full_scans(connection, statement, parameters, tables):
+    # Tiny dev tables make sequential scans look cheap, so forbid them and
+    # see whether the planner still has to fall back to one
+    connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    plan = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    scans = []
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in tables:
+            scans.append(node['Relation Name'])
+        nodes.extend(node.get('Plans', []))
+    return scans
+
+
+def find_full_scans(urls):
+    """
+    Requests each url with the test client, EXPLAINs every SELECT it issued
+    and returns a list of (url, table, statement) for full table scans.
+    """
+    tables = set(db.metadata.tables)
+    tables |= {table.split('.')[-1] for table in tables}
+    explain = _postgres_full_scans if db.engine.dialect.name == 'postgresql' else _sqlite_full_scans
+
+    user = User.query.order_by(User.id).first()
+    client = current_app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+
+    failures = []
+    for url in urls:
+        status, statements = _capture_selects(client, url)
+        if status >= 500:
+            failures.append((url, None, f'request failed with status {status}'))
+            continue
+        with db.engine.connect() as connection:
+            for statement, parameters in statements:
+                with connection.begin():
+                    for table in explain(connection, statement, parameters, tables):
+                        failures.append((url, table, statement))
+    return failures
+
+
+# Creates the `flask perf explain` command
+@perf_commands.command('explain')
+def explain():
+    """Fail if a hot endpoint query falls back to a full table scan"""
+    ids = {
+        'user_id': User.query.order_by(User.id).first().id,
+        'pin_id': Pin.query.order_by(Pin.id).first().id,
+        'board_id': Board.query.filter_by(is_private=False).order_by(Board.id).first().id,
+    }
+    failures = find_full_scans([url.format(**ids) for url in HOT_ENDPOINTS])
+
+    for url, table, statement in failures:
+        click.echo(f'FULL SCAN of {table} in {url}:\n  {" ".join(statement.split())}', err=True)
+    if failures:
+        raise SystemExit(1)
+    click.echo(f'{len(HOT_ENDPOINTS)} endpoints checked, no full table scans')
+
+
+def _serializer_cases():
+    """
+    The list views served from column projections, each as (name, ORM
+    serializer, projected serializer). Both take a page size and serialize
+    the same rows in the same order.
+    """
+    # The busiest liker and the most commented pin give the fullest pages
+    liker_id = db.session.query(Like.user_id)\
+        .group_by(Like.user_id).order_by(func.count().desc()).limit(1).scalar()
+    commented_pin_id = db.session.query(Comment.pin_id)\
+        .group_by(Comment.pin_id).order_by(func.count().desc()).limit(1).scalar()
+
+    def pins():
+        return Pin.query.order_by(desc(Pin.created_at), desc(Pin.id))
+
+    def liked_pins():
+        return Pin.query.join(Like, Pin.id == Like.pin_id)\
+            .filter(Like.user_id == liker_id)\
+            .order_by(desc(Like.created_at), desc(Like.id))
+
+    def comments():
+        return Comment.query.filter_by(pin_id=commented_pin_id)\
+            .order_by(desc(Comment.created_at), desc(Comment.id))
+
+    def boards():
+        # Primary key order, the board listings themselves are per user
+        return Board.query.order_by(desc(Board.id))
+
+    def users():
+        return User.query.order_by(User.id)
+
+    return [
+        ('pins', lambda n: [pin.to_dict() for pin in pins().options(joinedload(Pin.user)).limit(n)],
+         lambda n: pin_dicts(project_pins(pins()).limit(n))),
+        ('liked pins', lambda n: [pin.to_dict() for pin in liked_pins().options(joinedload(Pin.user)).limit(n)],
+         lambda n: pin_dicts(project_pins(liked_pins()).limit(n))),
+        ('comments', lambda n: [comment.to_dict() for comment in comments().options(joinedload(Comment.user)).limit(n)],
+         lambda n: comment_dicts(project_comments(comments()).limit(n))),
+        ('boards', lambda n: Board.to_dict_many(boards().options(joinedload(Board.user)).limit(n)),
+         lambda n: board_dicts(project_boards(boards()).limit(n))),
+        ('boards with pins', lambda n: Board.to_dict_many(boards().options(joinedload(Board.user)).limit(n), include_pins=True),
+         lambda n: board_dicts(project_boards(boards()).limit(n), include_pins=True)),
+        ('users', lambda n: [user.to_dict() for user in users().limit(n)],
+         lambda n: user_dicts(project_users(users()).limit(n))),
+    ]
+
+
+def _median_seconds(serialize, size, repeat):
+    timings = []
+    for _ in range(repeat):
+        # Start from an empty identity map, like every request does
+        db.session.expunge_all()
+        start = time.perf_counter()
+        result = serialize(size)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+# Creates the `flask perf serializers` command
+@perf_commands.command('serializers')
+@click.option('--sizes', default='20,50,100', show_default=True, help='Comma separated page sizes.')
+@click.option('--repeat', default=20, show_default=True, help='Timed runs per page, the median is reported.')
+def serializers(sizes, repeat):
+    """Check the projected list serializers match to_dict, and time both"""
+    dumps = current_app.json.dumps
+    mismatches = 0
+    click.echo(f'{"view":<20}{"size":>6}{"rows":>6}{"orm ms":>10}{"projected ms":>14}{"speedup":>9}  parity')
+    for name, orm, projected in _serializer_cases():
+        for size in [int(size) for size in sizes.split(',')]:
+            orm_seconds, expected = _median_seconds(orm, size, repeat)
+            projected_seconds, actual = _median_seconds(projected, size, repeat)
+            same = dumps(expected) == dumps(actual)
+            mismatches += not same
+            click.echo(
+                f'{name:<20}{size:>6}{len(actual):>6}{orm_seconds * 1000:>10.2f}{projected_seconds * 1000:>14.2f}'
+                f'{orm_seconds / projected_seconds:>8.1f}x  {"ok" if same else "MISMATCH"}'
+            )
+    if mismatches:
+        click.echo(f'{mismatches} projected serializer(s) differ from to_dict', err=True)
+        raise SystemExit(1)
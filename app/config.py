@@ -1,6 +1,43 @@
 import os
 
 
+def _engine_options(database_uri):
+    """
+    Connection pool settings for SQLAlchemy. Every gunicorn worker process
+    gets its own pool, so the database sees up to
+    workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+    """
+    options = {
+        # Test connections before use, so a database restart or an idle
+        # timeout on the server doesn't surface as a failed request
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+    }
+    if database_uri.startswith('sqlite'):
+        # SQLite connections are files, there is no server side pool to size
+        return options
+
+    options.update({
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        # Recycle connections before the server or a proxy drops them
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    })
+    statement_timeout = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+    if database_uri.startswith('postgresql') and statement_timeout:
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+    return options
+
+
+def _replica_binds():
+    # DATABASE_REPLICA_URLS is a comma separated list of read replica URLs
+    urls = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    return {
+        f'replica_{index}': url.replace('postgres://', 'postgresql://')
+        for index, url in enumerate(urls)
+    }
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY')
     FLASK_RUN_PORT = os.environ.get('FLASK_RUN_PORT')
@@ -11,4 +48,89 @@ class Config:
     # so the connection uri must be updated here (for production)
     SQLALCHEMY_DATABASE_URI = os.environ.get(
         'DATABASE_URL', 'sqlite:///dev.db').replace('postgres://', 'postgresql://')
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
+    # Optional read replicas. GET requests read from one of them, picked
+    # 'round_robin' or by 'least_connections', except for a user's requests
+    # within DB_READ_YOUR_WRITES_SECONDS of their last write.
+    SQLALCHEMY_BINDS = _replica_binds()
+    DB_REPLICA_SELECTION = os.environ.get('DB_REPLICA_SELECTION', 'round_robin')
+    DB_READ_YOUR_WRITES_SECONDS = int(os.environ.get('DB_READ_YOUR_WRITES_SECONDS', 5))
     SQLALCHEMY_ECHO = os.environ.get('FLASK_ENV') == 'development'
+    # Home feeds are materialized per user and capped at FEED_MAX_LENGTH pins
+    # by `flask feed trim`, run it periodically (e.g. Heroku Scheduler).
+    # Pins by authors with more followers than FEED_FANOUT_MAX_FOLLOWERS are
+    # merged in when the feed is read instead of being copied to every follower.
+    FEED_MAX_LENGTH = int(os.environ.get('FEED_MAX_LENGTH', 500))
+    FEED_FANOUT_MAX_FOLLOWERS = int(os.environ.get('FEED_FANOUT_MAX_FOLLOWERS', 1000))
+    # How page-numbered list endpoints compute total and pages: 'exact',
+    # 'cached' (for PAGINATION_COUNT_TTL seconds per filter), 'estimated'
+    # (PostgreSQL planner estimate) or 'none'. Clients can pick one with
+    # ?count=. The infinite scroll endpoints (all pins and the home feed)
+    # only need has_next and count nothing unless asked to.
+    PAGINATION_COUNT_STRATEGY = os.environ.get('PAGINATION_COUNT_STRATEGY', 'exact')
+    PAGINATION_COUNT_TTL = int(os.environ.get('PAGINATION_COUNT_TTL', 60))
+    # Budgets of the paginated list endpoints: per_page is capped at
+    # PAGINATION_MAX_PER_PAGE, page numbers can't reach further than
+    # PAGINATION_ROW_BUDGET rows (cursors can), and statements are cancelled
+    # after LIST_QUERY_TIMEOUT_MS.
+    PAGINATION_PER_PAGE = int(os.environ.get('PAGINATION_PER_PAGE', 20))
+    PAGINATION_MAX_PER_PAGE = int(os.environ.get('PAGINATION_MAX_PER_PAGE', 100))
+    PAGINATION_ROW_BUDGET = int(os.environ.get('PAGINATION_ROW_BUDGET', 10000))
+    LIST_QUERY_TIMEOUT_MS = int(os.environ.get('LIST_QUERY_TIMEOUT_MS', 2000))
+    # Response cache for public read endpoints. 'memory' is per process,
+    # 'file' shares entries and invalidations between gunicorn workers (the
+    # default of gunicorn.conf.py with more than one worker), 'none'
+    # disables it.
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 60))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+    RESPONSE_CACHE_DIR = os.environ.get('RESPONSE_CACHE_DIR')
+    # Per-process cache of the logged in user for load_user. Entries are
+    # checked against the user's updated_at, the TTL bounds how long another
+    # worker's copy can lag behind a profile update.
+    USER_CACHE_ENABLED = os.environ.get('USER_CACHE_ENABLED', 'true').lower() == 'true'
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 30))
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 1024))
+    # Password hashing runs on PASSWORD_HASH_WORKERS threads per process,
+    # with up to PASSWORD_HASH_QUEUE requests waiting at most
+    # PASSWORD_HASH_WAIT_MS for one (then 503). Passwords stored with another
+    # PASSWORD_HASH_METHOD are rehashed when their user logs in, so raising
+    # or lowering the iterations trades CPU per login against throughput.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 8))
+    PASSWORD_HASH_WAIT_MS = int(os.environ.get('PASSWORD_HASH_WAIT_MS', 1000))
+    # Live comment and like updates (Server-Sent Events). 'memory' reaches
+    # the streams of the publishing process only, 'sqlite' every worker on
+    # the host through EVENTS_DB_PATH, 'none' disables them. Each stream
+    # holds a thread (or greenlet) of its worker, so a process serves at
+    # most EVENTS_MAX_STREAMS, a client that falls EVENTS_QUEUE_SIZE events
+    # behind is told to reload, and streams without events for
+    # EVENTS_IDLE_TIMEOUT seconds are closed (clients reconnect). gunicorn.conf.py
+    # defaults to 'sqlite' when it runs more than one worker, and lowers
+    # EVENTS_MAX_STREAMS so every worker keeps one request free for the API.
+    EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND', 'memory')
+    EVENTS_DB_PATH = os.environ.get('EVENTS_DB_PATH')
+    EVENTS_POLL_INTERVAL_MS = int(os.environ.get('EVENTS_POLL_INTERVAL_MS', 250))
+    EVENTS_HISTORY = int(os.environ.get('EVENTS_HISTORY', 1000))
+    EVENTS_MAX_STREAMS = int(os.environ.get('EVENTS_MAX_STREAMS', 50))
+    EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 100))
+    EVENTS_HEARTBEAT_SECONDS = int(os.environ.get('EVENTS_HEARTBEAT_SECONDS', 15))
+    EVENTS_IDLE_TIMEOUT = int(os.environ.get('EVENTS_IDLE_TIMEOUT', 300))
+    # Write-behind mode for likes and follows: toggles are appended to the
+    # SQLite file WRITE_BEHIND_PATH (keep it on a persistent disk) and
+    # applied in coalesced batches every WRITE_BEHIND_INTERVAL_MS. Responses
+    # carry the count the toggle leads to, reads lag by up to the interval.
+    WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+    WRITE_BEHIND_PATH = os.environ.get('WRITE_BEHIND_PATH')
+    WRITE_BEHIND_INTERVAL_MS = int(os.environ.get('WRITE_BEHIND_INTERVAL_MS', 500))
+    WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 1000))
+    # Per-request query counting and timing (Server-Timing header and
+    # /api/_metrics). Requests running more than REQUEST_QUERY_BUDGET
+    # statements or taking longer than REQUEST_LATENCY_BUDGET_MS are logged
+    # with their statements and an N+1 report. /api/_metrics answers 404
+    # unless requested with `Authorization: Bearer <INSTRUMENTATION_METRICS_TOKEN>`.
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', 'true').lower() == 'true'
+    REQUEST_QUERY_BUDGET = int(os.environ.get('REQUEST_QUERY_BUDGET', 25))
+    REQUEST_LATENCY_BUDGET_MS = int(os.environ.get('REQUEST_LATENCY_BUDGET_MS', 500))
+    INSTRUMENTATION_METRICS_TOKEN = os.environ.get('INSTRUMENTATION_METRICS_TOKEN')
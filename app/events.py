@@ -0,0 +1,361 @@
+import itertools
+import os
+import queue
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+from flask import current_app
+
+
+# How long clients wait before reconnecting a closed stream
+RETRY_MILLISECONDS = 3000
+
+
+class Event:
+    """One message of a channel, id increases with every published event"""
+
+    __slots__ = ('id', 'channel', 'name', 'data')
+
+    def __init__(self, id, channel, name, data):
+        self.id = id
+        self.channel = channel
+        self.name = name
+        self.data = data
+
+    def encode(self, scope):
+        """The event in the text/event-stream format, its id prefixed with the broker's scope"""
+        return f'id: {scope}:{self.id}\nevent: {self.name}\ndata: {self.data}\n\n'
+
+
+class Subscription:
+    """
+    The events of some channels for one stream, queued until the stream
+    sends them. A stream that can't keep up gets at most max_queued events
+    behind and is then marked overflowed, instead of buffering without bound.
+    """
+
+    def __init__(self, channels, max_queued=100):
+        self.channels = channels
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=max_queued)
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """The next event, or None if there was none for timeout seconds"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class MemoryBroker:
+    """
+    Publishes events to the subscriptions of this process. The last
+    `history` events are kept so reconnecting streams can catch up.
+    """
+
+    def __init__(self, history=1000):
+        self._subscriptions = {}
+        self._history = deque(maxlen=history)
+        self._ids = itertools.count(1)
+        self._boot = secrets.token_hex(4)
+        self._lock = threading.Lock()
+
+    @property
+    def scope(self):
+        """
+        Where the event ids come from. Ids only count up within one process,
+        so a Last-Event-ID handed out by another worker (or before a
+        restart) can't be replayed from here.
+        """
+        return f'{self._boot}.{os.getpid()}'
+
+    def subscribe(self, channels, max_queued=100):
+        subscription = Subscription(channels, max_queued)
+        with self._lock:
+            for channel in channels:
+                self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscriptions = self._subscriptions.get(channel)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._subscriptions[channel]
+
+    def _dispatch(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(event.channel, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def publish(self, channel, name, data):
+        with self._lock:
+            event = Event(next(self._ids), channel, name, data)
+            self._history.append(event)
+        self._dispatch(event)
+
+    def replay(self, channels, last_id):
+        """The kept events of channels published after last_id"""
+        with self._lock:
+            return [event for event in self._history if event.id > last_id and event.channel in channels]
+
+
+class SQLiteBroker(MemoryBroker):
+    """
+    Publishes events through a SQLite file, so every gunicorn worker on the
+    host sees the events published by the others. One thread per process
+    polls the file for new events every poll_interval seconds and hands
+    them to the process's subscriptions, however many streams are open.
+    The file keeps the last `history` events for reconnecting streams.
+    """
+
+    def __init__(self, path, history=1000, poll_interval=0.25):
+        super().__init__(history)
+        self.path = path
+        self.history = history
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._poller = None
+        self._pid = None
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS events ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, '
+                'name TEXT NOT NULL, data TEXT NOT NULL)'
+            )
+            # Ids start over when the file is replaced, so it gets a scope
+            # of its own
+            connection.execute('CREATE TABLE IF NOT EXISTS broker (scope TEXT NOT NULL)')
+            connection.execute(
+                'INSERT INTO broker (scope) SELECT ? WHERE NOT EXISTS (SELECT 1 FROM broker)', (secrets.token_hex(4),)
+            )
+            self._scope = connection.execute('SELECT scope FROM broker').fetchone()[0]
+
+    @property
+    def scope(self):
+        return self._scope
+
+    def _connect(self):
+        # Connections can't be shared between threads or forked processes
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def subscribe(self, channels, max_queued=100):
+        subscription = super().subscribe(channels, max_queued)
+        with self._lock:
+            if self._poller is None or self._pid != os.getpid():
+                self._poller = threading.Thread(target=self._poll, name='events-poller', daemon=True)
+                self._pid = os.getpid()
+                self._poller.start()
+        return subscription
+
+    def _poll(self):
+        connection = self._connect()
+        last_id = connection.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                rows = connection.execute(
+                    'SELECT id, channel, name, data FROM events WHERE id > ? ORDER BY id', (last_id,)
+                ).fetchall()
+            except sqlite3.Error:
+                # Locked for longer than the timeout, try again next round
+                continue
+            for row in rows:
+                self._dispatch(Event(*row))
+                last_id = row[0]
+
+    def publish(self, channel, name, data):
+        connection = self._connect()
+        event_id = connection.execute(
+            'INSERT INTO events (channel, name, data) VALUES (?, ?, ?)', (channel, name, data)
+        ).lastrowid
+        if event_id % 100 == 0:
+            connection.execute('DELETE FROM events WHERE id <= ?', (event_id - self.history,))
+
+    def replay(self, channels, last_id):
+        placeholders = ', '.join('?' * len(channels))
+        rows = self._connect().execute(
+            f'SELECT id, channel, name, data FROM events WHERE id > ? AND channel IN ({placeholders}) ORDER BY id',
+            (last_id, *channels)
+        ).fetchall()
+        return [Event(*row) for row in rows]
+
+
+class NullBroker(MemoryBroker):
+    """Broker used when live events are disabled, publishing does nothing"""
+
+    def publish(self, channel, name, data):
+        pass
+
+
+class Stream:
+    """
+    The events of one admitted stream. Its slot is freed when the events
+    run out, or when the server closes the response, even if the stream
+    never started sending.
+    """
+
+    def __init__(self, events, release):
+        self._events = events
+        self._release = release
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._events)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        self._events.close()
+        with self._lock:
+            release, self._release = self._release, None
+        if release is not None:
+            release()
+
+
+class EventStreams:
+    """
+    Live updates pushed to clients as Server-Sent Events, so open pin pages
+    don't poll the API (and the database) for new comments and likes.
+
+    EVENTS_BACKEND picks the broker: 'memory' only reaches the streams of
+    the publishing process, 'sqlite' reaches every worker on the host
+    through a shared file, 'none' disables publishing.
+
+    Every open stream holds a worker thread (or greenlet), so a process
+    serves at most EVENTS_MAX_STREAMS of them. Each one queues at most
+    EVENTS_QUEUE_SIZE events for a slow client and is closed after
+    EVENTS_IDLE_TIMEOUT seconds without events, clients reconnect with
+    Last-Event-ID and get what they missed.
+    """
+
+    def __init__(self, app=None):
+        self.broker = NullBroker()
+        self.max_streams = 50
+        self.max_queued = 100
+        self.heartbeat = 15
+        self.idle_timeout = 300
+        self.logger = None
+        self._open = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('EVENTS_BACKEND', 'memory')
+        history = app.config.get('EVENTS_HISTORY', 1000)
+        if backend == 'memory':
+            self.broker = MemoryBroker(history)
+        elif backend == 'sqlite':
+            path = app.config.get('EVENTS_DB_PATH') or os.path.join(tempfile.gettempdir(), 'myday-events.sqlite3')
+            self.broker = SQLiteBroker(path, history, app.config.get('EVENTS_POLL_INTERVAL_MS', 250) / 1000)
+        else:
+            self.broker = NullBroker()
+        self.max_streams = app.config.get('EVENTS_MAX_STREAMS', 50)
+        self.max_queued = app.config.get('EVENTS_QUEUE_SIZE', 100)
+        self.heartbeat = app.config.get('EVENTS_HEARTBEAT_SECONDS', 15)
+        self.idle_timeout = app.config.get('EVENTS_IDLE_TIMEOUT', 300)
+        self.logger = app.logger
+        app.extensions['event_streams'] = self
+
+    @property
+    def open_streams(self):
+        return self._open
+
+    def publish(self, channel, name, data):
+        """
+        Sends an event to the streams of channel, data is encoded as JSON.
+        Called after the change is committed, so a failure is only logged.
+        """
+        try:
+            self.broker.publish(channel, name, current_app.json.dumps(data))
+        except sqlite3.Error:
+            self.logger.exception('Could not publish %s to %s', name, channel)
+
+    def _release(self):
+        with self._lock:
+            self._open -= 1
+
+    def stream(self, channels, last_event_id=None):
+        """
+        Generates the text/event-stream of channels, starting with the events
+        published after last_event_id. Returns None if the process already
+        serves EVENTS_MAX_STREAMS streams.
+        """
+        # The slot is taken here, so concurrent requests can't all get past
+        # the check before one of their streams starts
+        with self._lock:
+            if self._open >= self.max_streams:
+                return None
+            self._open += 1
+
+        scope = self.broker.scope
+        last_id = 0
+        resync = False
+        if last_event_id:
+            id_scope, _, number = last_event_id.rpartition(':')
+            if id_scope == scope and number.isdigit():
+                last_id = int(number)
+            else:
+                # Issued by another worker's broker or before a restart, what
+                # the client missed can't be told from here
+                resync = True
+
+        def generate():
+            nonlocal last_id
+            subscription = self.broker.subscribe(channels, self.max_queued)
+            try:
+                yield f'retry: {RETRY_MILLISECONDS}\n\n'
+                if resync:
+                    yield 'event: resync\ndata: {}\n\n'
+                elif last_id:
+                    for event in self.broker.replay(channels, last_id):
+                        yield event.encode(scope)
+                        last_id = event.id
+
+                idle_until = time.monotonic() + self.idle_timeout
+                while time.monotonic() < idle_until:
+                    event = subscription.get(timeout=min(self.heartbeat, idle_until - time.monotonic()))
+                    if subscription.overflowed:
+                        # Events were dropped, the client reloads instead
+                        yield 'event: resync\ndata: {}\n\n'
+                        return
+                    if event is None:
+                        # Comment line, finds out about clients that left
+                        yield ': keepalive\n\n'
+                    elif event.id > last_id:
+                        # Replayed events can be queued as well
+                        yield event.encode(scope)
+                        last_id = event.id
+                        idle_until = time.monotonic() + self.idle_timeout
+            finally:
+                self.broker.unsubscribe(subscription)
+
+        return Stream(generate(), self._release)
+
+
+event_streams = EventStreams()
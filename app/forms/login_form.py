@@ -1,28 +1,37 @@
+from functools import cached_property
 from flask_wtf import FlaskForm
 from wtforms import StringField
 from wtforms.validators import DataRequired, Email, ValidationError
 from app.models import User
+from app.passwords import password_hasher
 
 
 def user_exists(form, field):
     # Checking if user exists
-    email = field.data
-    user = User.query.filter(User.email == email).first()
-    if not user:
+    if not form.user:
         raise ValidationError('Email provided not found.')
 
 
 def password_matches(form, field):
     # Checking if password matches
     password = field.data
-    email = form.data['email']
-    user = User.query.filter(User.email == email).first()
+    user = form.user
     if not user:
         raise ValidationError('No such user exists.')
-    if not user.check_password(password):
+    matches, form.new_password_hash = password_hasher.verify(user.hashed_password, password)
+    if not matches:
         raise ValidationError('Password was incorrect.')
 
 
 class LoginForm(FlaskForm):
     email = StringField('email', validators=[DataRequired(), user_exists])
-    password = StringField('password', validators=[DataRequired(), password_matches])
\ No newline at end of file
+    password = StringField('password', validators=[DataRequired(), password_matches])
+
+    # Set when the password was stored with another hash method than the
+    # configured one
+    new_password_hash = None
+
+    @cached_property
+    def user(self):
+        """The user with the submitted email, looked up once per request"""
+        return User.query.filter(User.email == self.email.data).first()
\ No newline at end of file
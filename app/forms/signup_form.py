@@ -1,29 +1,28 @@
 from flask_wtf import FlaskForm
+from sqlalchemy import or_
 from wtforms import StringField
-from wtforms.validators import DataRequired, Email, ValidationError
+from wtforms.validators import DataRequired, Email
 from app.models import User
 
 
-def user_exists(form, field):
-    # Checking if user exists
-    email = field.data
-    user = User.query.filter(User.email == email).first()
-    if user:
-        raise ValidationError('Email address is already in use.')
-
-
-def username_exists(form, field):
-    # Checking if username is already in use
-    username = field.data
-    user = User.query.filter(User.username == username).first()
-    if user:
-        raise ValidationError('Username is already in use.')
-
-
 class SignUpForm(FlaskForm):
-    username = StringField(
-        'username', validators=[DataRequired(), username_exists])
-    email = StringField('email', validators=[DataRequired(), user_exists])
+    # Usernames and emails are unique in the users table, sign_up inserts
+    # straight away and calls add_taken_errors if the insert conflicts
+    username = StringField('username', validators=[DataRequired()])
+    email = StringField('email', validators=[DataRequired()])
     password = StringField('password', validators=[DataRequired()])
     first_name = StringField('first_name', validators=[DataRequired()])
     last_name = StringField('last_name', validators=[DataRequired()])
+
+    def add_taken_errors(self):
+        """
+        Adds an error to the username and email fields if they are already in
+        use. Returns False if neither is, the insert failed for another reason.
+        """
+        taken = User.query.with_entities(User.username, User.email)\
+            .filter(or_(User.username == self.username.data, User.email == self.email.data)).all()
+        if any(row.username == self.username.data for row in taken):
+            self.username.errors.append('Username is already in use.')
+        if any(row.email == self.email.data for row in taken):
+            self.email.errors.append('Email address is already in use.')
+        return bool(taken)
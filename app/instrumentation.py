@@ -0,0 +1,204 @@
+import threading
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+class Instrumentation:
+    """
+    Per-request SQL and timing instrumentation.
+
+    Cursor events record every statement a request runs and how long it
+    took, and the JSON provider is timed for serialization. start_request()
+    and finish_request() wrap each request: they add a Server-Timing header,
+    update the per-process metrics rendered by render_metrics() in the
+    Prometheus text format, and log the statements of any request over its
+    query or latency budget, with repeated statements (N+1 suspects) first.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.query_budget = 0
+        self.latency_budget = 0
+        self.logger = None
+        self._lock = threading.Lock()
+        self._requests = Counter()
+        self._queries = Counter()
+        self._db_seconds = Counter()
+        self._serialize_seconds = Counter()
+        self._over_budget = Counter()
+        self._latency_buckets = Counter()
+        self._latency_sum = Counter()
+        self._latency_count = Counter()
+        self._caches = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('INSTRUMENTATION_ENABLED', True)
+        self.query_budget = app.config.get('REQUEST_QUERY_BUDGET', 25)
+        self.latency_budget = app.config.get('REQUEST_LATENCY_BUDGET_MS', 500) / 1000
+        self.logger = app.logger
+        if not self.enabled:
+            return
+
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+        # Time the JSON provider, which jsonify() and returned dicts go through.
+        # Providers that encode to bytes do it all in dumpb
+        name = 'dumpb' if hasattr(app.json, 'dumpb') else 'dumps'
+        encode = getattr(app.json, name)
+
+        def timed_encode(obj, **kwargs):
+            start = time.perf_counter()
+            try:
+                return encode(obj, **kwargs)
+            finally:
+                if has_request_context() and 'instrumentation' in g:
+                    g.instrumentation['serialize'] += time.perf_counter() - start
+
+        setattr(app.json, name, timed_encode)
+        app.extensions['instrumentation'] = self
+
+    def watch_cache(self, name, cache):
+        """Adds the hit and miss counts of a cache (anything with counters) to the metrics"""
+        self._caches[name] = cache
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Kept on the statement's own context, after_cursor_execute doesn't
+        # run for failed statements and nothing may outlive them
+        context._instrumentation_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._instrumentation_start
+        if has_request_context() and 'instrumentation' in g:
+            g.instrumentation['statements'].append((statement, elapsed))
+
+    def start_request(self):
+        if self.enabled:
+            g.instrumentation = {'start': time.perf_counter(), 'statements': [], 'serialize': 0.0}
+
+    def finish_request(self, response):
+        data = g.pop('instrumentation', None)
+        if data is None:
+            return response
+
+        elapsed = time.perf_counter() - data['start']
+        statements = data['statements']
+        db_time = sum(duration for _, duration in statements)
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={db_time * 1000:.2f};desc="{len(statements)} queries"',
+            f'serialize;dur={data["serialize"] * 1000:.2f}',
+            f'total;dur={elapsed * 1000:.2f}',
+        ])
+
+        endpoint = request.endpoint or 'unmatched'
+        over_budget = []
+        if len(statements) > self.query_budget:
+            over_budget.append('queries')
+        if elapsed > self.latency_budget:
+            over_budget.append('latency')
+
+        with self._lock:
+            self._requests[(endpoint, request.method, response.status_code)] += 1
+            self._queries[endpoint] += len(statements)
+            self._db_seconds[endpoint] += db_time
+            self._serialize_seconds[endpoint] += data['serialize']
+            self._latency_sum[endpoint] += elapsed
+            self._latency_count[endpoint] += 1
+            for bound in LATENCY_BUCKETS:
+                if elapsed <= bound:
+                    self._latency_buckets[(endpoint, bound)] += 1
+            for budget in over_budget:
+                self._over_budget[(endpoint, budget)] += 1
+
+        if over_budget:
+            self._log_slow_request(endpoint, elapsed, db_time, statements, over_budget)
+        return response
+
+    def _log_slow_request(self, endpoint, elapsed, db_time, statements, over_budget):
+        normalized = [' '.join(statement.split()) for statement, _ in statements]
+        repeated = [(statement, count) for statement, count in Counter(normalized).most_common() if count > 1]
+
+        lines = [
+            f'{request.method} {request.full_path} ({endpoint}) over its {" and ".join(over_budget)} budget: '
+            f'{elapsed * 1000:.1f} ms, {len(statements)} queries, {db_time * 1000:.1f} ms in the database'
+        ]
+        if repeated:
+            lines.append('Repeated statements (likely N+1):')
+            lines += [f'  {count}x {statement}' for statement, count in repeated]
+        lines.append('Statements:')
+        lines += [
+            f'  {duration * 1000:8.2f} ms  {statement}'
+            for statement, (_, duration) in zip(normalized, statements)
+        ]
+        self.logger.warning('\n'.join(lines))
+
+    def render_metrics(self):
+        """The metrics of this process in the Prometheus text exposition format"""
+        with self._lock:
+            lines = [
+                '# HELP myday_http_requests_total Requests handled.',
+                '# TYPE myday_http_requests_total counter',
+            ]
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(
+                    f'myday_http_requests_total{{endpoint="{_label(endpoint)}",method="{method}",status="{status}"}} {count}'
+                )
+
+            lines += [
+                '# HELP myday_http_request_duration_seconds Request latency.',
+                '# TYPE myday_http_request_duration_seconds histogram',
+            ]
+            for endpoint in sorted(self._latency_count):
+                label = _label(endpoint)
+                for bound in LATENCY_BUCKETS:
+                    count = self._latency_buckets[(endpoint, bound)]
+                    lines.append(f'myday_http_request_duration_seconds_bucket{{endpoint="{label}",le="{bound}"}} {count}')
+                lines += [
+                    f'myday_http_request_duration_seconds_bucket{{endpoint="{label}",le="+Inf"}} {self._latency_count[endpoint]}',
+                    f'myday_http_request_duration_seconds_sum{{endpoint="{label}"}} {self._latency_sum[endpoint]:.6f}',
+                    f'myday_http_request_duration_seconds_count{{endpoint="{label}"}} {self._latency_count[endpoint]}',
+                ]
+
+            for name, help_text, values in [
+                ('myday_db_queries_total', 'SQL statements executed.', self._queries),
+                ('myday_db_seconds_total', 'Time spent executing SQL statements.', self._db_seconds),
+                ('myday_serialization_seconds_total', 'Time spent encoding JSON responses.', self._serialize_seconds),
+            ]:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for endpoint, value in sorted(values.items()):
+                    value = value if isinstance(value, int) else f'{value:.6f}'
+                    lines.append(f'{name}{{endpoint="{_label(endpoint)}"}} {value}')
+
+            lines += [
+                '# HELP myday_budget_exceeded_total Requests over their query or latency budget.',
+                '# TYPE myday_budget_exceeded_total counter',
+            ]
+            for (endpoint, budget), count in sorted(self._over_budget.items()):
+                lines.append(f'myday_budget_exceeded_total{{endpoint="{_label(endpoint)}",budget="{budget}"}} {count}')
+
+            for name, help_text in [
+                ('hits', 'Cache lookups that found an entry.'),
+                ('misses', 'Cache lookups that found nothing.'),
+            ]:
+                lines += [f'# HELP myday_cache_{name}_total {help_text}', f'# TYPE myday_cache_{name}_total counter']
+                for cache_name, cache in sorted(self._caches.items()):
+                    lines.append(f'myday_cache_{name}_total{{cache="{cache_name}"}} {getattr(cache.counters, name)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+instrumentation = Instrumentation()
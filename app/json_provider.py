@@ -0,0 +1,60 @@
+import json
+from datetime import date
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - the stdlib encoder is used instead
+    orjson = None
+
+
+COMPACT_SEPARATORS = (',', ':')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that encodes with orjson when it is installed, straight to
+    bytes, and falls back to the stdlib encoder otherwise.
+
+    Output matches what jsonify produced before byte for byte: compact,
+    sorted keys and ASCII only. orjson writes non-ASCII characters (and DEL)
+    unescaped, so the rare document containing any is re-encoded with the
+    stdlib.
+    Dates and datetimes are written in ISO 8601, natively by orjson, so
+    to_dict methods can return them as they are.
+    """
+
+    def default(self, o):
+        if isinstance(o, date):
+            return o.isoformat()
+        return super().default(o)
+
+    def dumpb(self, obj, newline=False):
+        """Serializes obj to compact JSON bytes"""
+        if orjson is not None:
+            option = orjson.OPT_SORT_KEYS
+            if newline:
+                option |= orjson.OPT_APPEND_NEWLINE
+            try:
+                data = orjson.dumps(obj, default=self.default, option=option)
+            except TypeError:
+                # Non-string keys, huge integers... the stdlib handles them
+                data = None
+            if data is not None and data.isascii() and b'\x7f' not in data:
+                return data
+
+        data = json.dumps(
+            obj, default=self.default, ensure_ascii=self.ensure_ascii, sort_keys=self.sort_keys,
+            separators=COMPACT_SEPARATORS
+        )
+        return (data + '\n' if newline else data).encode()
+
+    def dumps(self, obj, **kwargs):
+        if kwargs and kwargs != {'separators': COMPACT_SEPARATORS}:
+            return super().dumps(obj, **kwargs)
+        return self.dumpb(obj).decode()
+
+    def response(self, *args, **kwargs):
+        # Never pretty-printed, even in debug mode
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumpb(obj, newline=True), mimetype=self.mimetype)
@@ -5,4 +5,10 @@ from .board import Board
 from .like import Like
 from .comment import Comment
 from .follow import Follow, BoardFollower
+from .feed import FeedItem, fan_out_pin, backfill_follow, retract_follow, feed_query, rebuild_feeds, trim_feeds
+from .counters import reconcile_counters, set_counted_row, set_counted_rows
+from .search import search_pins
+from .replicas import replica_router
+from .projections import project_users, user_dicts, project_pins, pin_dicts, project_comments, comment_dicts, \
+    project_boards, board_dicts
 from .db import environment, SCHEMA
@@ -1,11 +1,16 @@
 from .db import db, environment, SCHEMA, add_prefix_for_prod
+from .pin import Pin
 from datetime import datetime
+from sqlalchemy import func, select
 
 class Board(db.Model):
     __tablename__ = 'boards'
     
-    if environment == "production":
-        __table_args__ = {'schema': SCHEMA}
+    # Indexes match the access paths of the list endpoints
+    __table_args__ = (
+        db.Index('ix_boards_user_id_created_at', 'user_id', 'created_at'),
+        {'schema': SCHEMA} if environment == "production" else {}
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -15,20 +20,27 @@ class Board(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Denormalized counters, maintained by the listeners in counters.py
+    pins_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    followers_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     # Relationships
     user = db.relationship('User', back_populates='boards')
     pins = db.relationship('Pin', back_populates='board', cascade='all, delete-orphan')
     followers = db.relationship('BoardFollower', back_populates='board', cascade='all, delete-orphan')
 
-    def to_dict(self, include_user=True, include_stats=True, include_pins=False):
+    # Number of pins embedded by to_dict(include_pins=True)
+    PREVIEW_PINS = 20
+
+    def to_dict(self, include_user=True, include_stats=True, include_pins=False, top_pins=None):
         board_dict = {
             'id': self.id,
             'name': self.name,
             'description': self.description,
             'is_private': self.is_private,
             'user_id': self.user_id,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
         
         if include_user and self.user:
@@ -41,14 +53,66 @@ class Board(db.Model):
             }
         
         if include_stats:
-            board_dict['pins_count'] = len(self.pins)
-            board_dict['followers_count'] = len(self.followers)
+            board_dict['pins_count'] = self.pins_count
+            board_dict['followers_count'] = self.followers_count
+        
+        # top_pins holds the board's first pins when they were preloaded by
+        # to_dict_many, otherwise the whole collection is loaded
+        pins = self.pins if top_pins is None else top_pins
         
         if include_pins:
-            board_dict['pins'] = [pin.to_dict(include_user=False, include_stats=False) for pin in self.pins[:20]]
+            board_dict['pins'] = [pin.to_dict(include_user=False, include_stats=False) for pin in pins[:self.PREVIEW_PINS]]
         
         # Add cover image from first pin
-        if self.pins:
-            board_dict['cover_image'] = self.pins[0].image_url
+        if pins:
+            board_dict['cover_image'] = pins[0].image_url
         
-        return board_dict
\ No newline at end of file
+        return board_dict
+
+    @classmethod
+    def preview_pins(cls, board_ids, include_pins=False, columns=(Pin,)):
+        """
+        The first pins of every board in one windowed query, as board id ->
+        pins: PREVIEW_PINS of them, or just the cover pin unless include_pins.
+        columns picks what is loaded for each pin, Pin instances by default.
+        """
+        limit = cls.PREVIEW_PINS if include_pins else 1
+        ranked = select(
+            Pin.id,
+            func.row_number().over(partition_by=Pin.board_id, order_by=Pin.id).label('position')
+        ).where(Pin.board_id.in_(board_ids)).subquery()
+        result = db.session.execute(
+            select(*columns)
+            .join(ranked, ranked.c.id == Pin.id)
+            .where(ranked.c.position <= limit)
+            .order_by(Pin.board_id, Pin.id)
+        )
+
+        pins_by_board = {board_id: [] for board_id in board_ids}
+        for pin in (result.scalars() if len(columns) == 1 else result):
+            pins_by_board[pin.board_id].append(pin)
+        return pins_by_board
+
+    @classmethod
+    def to_dict_many(cls, boards, include_user=True, include_stats=True, include_pins=False):
+        """
+        Serializes a list of boards with one windowed query for the first
+        pins of every board (just the cover pin unless include_pins), so
+        memory is bounded by PREVIEW_PINS rather than by board size. Load the
+        boards with joinedload(Board.user) when including the owners.
+        """
+        boards = list(boards)
+        if not boards:
+            return []
+
+        pins_by_board = cls.preview_pins([board.id for board in boards], include_pins)
+
+        return [
+            board.to_dict(
+                include_user=include_user,
+                include_stats=include_stats,
+                include_pins=include_pins,
+                top_pins=pins_by_board[board.id]
+            )
+            for board in boards
+        ]
\ No newline at end of file
@@ -4,8 +4,12 @@ from datetime import datetime
 class Comment(db.Model):
     __tablename__ = 'comments'
     
-    if environment == "production":
-        __table_args__ = {'schema': SCHEMA}
+    # Indexes match the access paths of the list endpoints
+    __table_args__ = (
+        db.Index('ix_comments_pin_id_created_at', 'pin_id', 'created_at'),
+        db.Index('ix_comments_user_id', 'user_id'),
+        {'schema': SCHEMA} if environment == "production" else {}
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
@@ -24,8 +28,8 @@ class Comment(db.Model):
             'content': self.content,
             'user_id': self.user_id,
             'pin_id': self.pin_id,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
         
         if include_user and self.user:
@@ -0,0 +1,227 @@
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import and_, event, func, select, inspect, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from .db import db
+from .user import User
+from .board import Board
+from .pin import Pin
+from .like import Like
+from .comment import Comment
+from .follow import Follow, BoardFollower
+
+
+# Every denormalized counter, as (owner model, counter column, child model,
+# child foreign key). This drives both the write-time listeners below and
+# reconcile_counters, so the two can never disagree about what is counted.
+COUNTERS = [
+    (Pin, 'likes_count', Like, 'pin_id'),
+    (Pin, 'comments_count', Comment, 'pin_id'),
+    (Board, 'pins_count', Pin, 'board_id'),
+    (Board, 'followers_count', BoardFollower, 'board_id'),
+    (User, 'pins_count', Pin, 'user_id'),
+    (User, 'boards_count', Board, 'user_id'),
+    (User, 'followers_count', Follow, 'followed_id'),
+    (User, 'following_count', Follow, 'follower_id'),
+]
+
+
+def _counter_values(table, column, value):
+    # Setting updated_at to itself stops its onupdate default from firing,
+    # a counter moving is not an edit of the row
+    return {column: value, 'updated_at': table.c.updated_at}
+
+
+def _bump(connection, model, column, owner_id, delta):
+    # A relative UPDATE inside the flush keeps the counter in the same
+    # transaction as the row that changed it, without a read-modify-write race
+    if owner_id is None:
+        return
+    table = model.__table__
+    connection.execute(
+        table.update()
+        .where(table.c.id == owner_id)
+        .values(_counter_values(table, column, table.c[column] + delta))
+    )
+
+
+def _register(model, column, child, foreign_key):
+    def after_insert(mapper, connection, target):
+        _bump(connection, model, column, getattr(target, foreign_key), 1)
+
+    def after_delete(mapper, connection, target):
+        _bump(connection, model, column, getattr(target, foreign_key), -1)
+
+    def after_update(mapper, connection, target):
+        # Only pins can move between owners (update_pin changes board_id)
+        history = inspect(target).attrs[foreign_key].history
+        if not history.has_changes():
+            return
+        for old_id in history.deleted:
+            _bump(connection, model, column, old_id, -1)
+        for new_id in history.added:
+            _bump(connection, model, column, new_id, 1)
+
+    event.listen(child, 'after_insert', after_insert)
+    event.listen(child, 'after_delete', after_delete)
+    event.listen(child, 'after_update', after_update)
+
+
+for counter in COUNTERS:
+    _register(*counter)
+
+
+def reconcile_counters():
+    """
+    Recomputes every denormalized counter from its source table and repairs
+    any rows that drifted. Returns a dict of 'table.column' -> rows fixed.
+    """
+    repaired = {}
+    for model, column, child, foreign_key in COUNTERS:
+        actual = select(func.count(child.id))\
+            .where(getattr(child, foreign_key) == model.id)\
+            .scalar_subquery()
+        result = db.session.execute(
+            model.__table__.update()
+            .where(getattr(model, column) != actual)
+            .values(_counter_values(model.__table__, column, actual))
+        )
+        repaired[f'{model.__tablename__}.{column}'] = result.rowcount
+    db.session.commit()
+    return repaired
+
+
+
+def _counters_of(table):
+    return [(model, column, foreign_key) for model, column, child, foreign_key in COUNTERS if child.__table__ is table]
+
+
+def _postgres_set_row(table, present, owner, column, keys):
+    # A single statement: the INSERT/DELETE runs in a CTE, every counter is
+    # moved by the number of rows it really changed, and the UPDATE of the
+    # requested counter returns its new value
+    if present:
+        change = postgresql.insert(table)\
+            .values(created_at=datetime.utcnow(), **keys)\
+            .on_conflict_do_nothing(index_elements=list(keys))
+    else:
+        change = table.delete().where(and_(*(table.c[key] == value for key, value in keys.items())))
+    changed = change.returning(table.c.id).cte('changed')
+    changed_count = select(func.count()).select_from(changed).scalar_subquery()
+    delta = changed_count if present else -changed_count
+
+    statement, other_updates = None, []
+    for model, counter, foreign_key in _counters_of(table):
+        owner_table = model.__table__
+        update = owner_table.update()\
+            .where(owner_table.c.id == keys[foreign_key])\
+            .values(_counter_values(owner_table, counter, owner_table.c[counter] + delta))
+        if model is owner and counter == column:
+            statement = update.returning(changed_count, owner_table.c[counter])
+        else:
+            other_updates.append(update.cte(f'{model.__tablename__}_{counter}'))
+    for update in other_updates:
+        statement = statement.add_cte(update)
+
+    changed_rows, count = db.session.execute(statement).one()
+    return changed_rows > 0, count
+
+
+def set_counted_row(child, present, owner, column, **keys):
+    """
+    Idempotently inserts (present=True) or deletes the child row identified
+    by keys, e.g. a Like by (user_id, pin_id), and moves its counters by the
+    rows actually changed. A duplicate insert is skipped by ON CONFLICT DO
+    NOTHING and a repeated delete matches nothing, so concurrent toggles
+    neither raise IntegrityErrors nor double count.
+
+    Returns (changed, the new value of owner.column for keys' owner).
+    """
+    table = child.__table__
+    owner_id = keys[next(fk for model, counter, fk in _counters_of(table) if model is owner and counter == column)]
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return _postgres_set_row(table, present, owner, column, keys)
+
+    if not present:
+        statement = table.delete().where(and_(*(table.c[key] == value for key, value in keys.items())))
+        changed = db.session.execute(statement).rowcount > 0
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(table)\
+            .values(created_at=datetime.utcnow(), **keys)\
+            .on_conflict_do_nothing(index_elements=list(keys))
+        changed = db.session.execute(statement).rowcount > 0
+    else:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(created_at=datetime.utcnow(), **keys))
+            changed = True
+        except IntegrityError:
+            changed = False
+
+    # Core statements bypass the mapper listeners, so move the counters here
+    if changed:
+        connection = db.session.connection()
+        for model, counter, foreign_key in _counters_of(table):
+            _bump(connection, model, counter, keys[foreign_key], 1 if present else -1)
+
+    owner_table = owner.__table__
+    count = db.session.execute(select(owner_table.c[column]).where(owner_table.c.id == owner_id)).scalar()
+    return changed, count
+
+
+def _chunks(items, size=500):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def set_counted_rows(child, key_columns, changes):
+    """
+    Bulk set_counted_row for the write-behind queue. changes maps the values
+    of key_columns, e.g. (user_id, pin_id) of Likes, to whether that row
+    should exist. Only the rows that really change are inserted or deleted,
+    and each counter is moved once per owner by the net number of rows,
+    so a like storm on one pin is a single UPDATE of its likes_count.
+
+    Rows referencing a user, pin or board deleted in the meantime are
+    dropped. Returns the (inserted, deleted) keys.
+    """
+    table = child.__table__
+    columns = [table.c[name] for name in key_columns]
+    keys = list(changes)
+
+    existing = set()
+    for chunk in _chunks(keys):
+        existing.update(tuple(row) for row in db.session.execute(select(*columns).where(tuple_(*columns).in_(chunk))))
+    inserted = [key for key in keys if changes[key] and key not in existing]
+    deleted = [key for key in keys if not changes[key] and key in existing]
+
+    for position, column in enumerate(columns):
+        for foreign_key in column.foreign_keys:
+            referenced = foreign_key.column
+            wanted = list({key[position] for key in inserted})
+            found = set()
+            for chunk in _chunks(wanted):
+                found.update(db.session.execute(select(referenced).where(referenced.in_(chunk))).scalars())
+            inserted = [key for key in inserted if key[position] in found]
+
+    if inserted:
+        now = datetime.utcnow()
+        db.session.execute(table.insert(), [dict(zip(key_columns, key), created_at=now) for key in inserted])
+    for chunk in _chunks(deleted):
+        db.session.execute(table.delete().where(tuple_(*columns).in_(chunk)))
+
+    deltas = Counter()
+    for changed, delta in ((inserted, 1), (deleted, -1)):
+        for key in changed:
+            values = dict(zip(key_columns, key))
+            for model, counter, foreign_key in _counters_of(table):
+                deltas[(model, counter, values[foreign_key])] += delta
+    connection = db.session.connection()
+    for (model, counter, owner_id), delta in deltas.items():
+        if delta:
+            _bump(connection, model, counter, owner_id, delta)
+
+    return inserted, deleted
@@ -1,11 +1,14 @@
 from flask_sqlalchemy import SQLAlchemy
+from .replicas import RoutingSession
 
 import os
 environment = os.getenv("FLASK_ENV")
 SCHEMA = os.environ.get("SCHEMA")
 
 
-db = SQLAlchemy()
+# RoutingSession sends the reads of GET requests to a replica when
+# replicas are configured (see replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # helper function for adding prefix to foreign key column references in production
 def add_prefix_for_prod(attr):
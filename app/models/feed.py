@@ -0,0 +1,183 @@
+from flask import current_app
+from sqlalchemy import event, func, select, delete, literal, union
+from .db import db, environment, SCHEMA, add_prefix_for_prod
+from .user import User
+from .pin import Pin
+from .follow import Follow
+
+
+class FeedItem(db.Model):
+    """
+    One pin in a user's materialized home feed. Rows are written when a
+    followed user creates or saves a pin (fan-out on write), so reading a
+    feed is a single range scan over (user_id, created_at, pin_id).
+    """
+    __tablename__ = 'feed_items'
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'pin_id', name='unique_feed_item'),
+        db.Index('ix_feed_items_user_id_created_at_pin_id', 'user_id', 'created_at', 'pin_id'),
+        db.Index('ix_feed_items_user_id_author_id', 'user_id', 'author_id'),
+        db.Index('ix_feed_items_pin_id', 'pin_id'),
+        {'schema': SCHEMA} if environment == "production" else {}
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey(add_prefix_for_prod('users.id')), nullable=False)
+    pin_id = db.Column(db.Integer, db.ForeignKey(add_prefix_for_prod('pins.id')), nullable=False)
+    author_id = db.Column(db.Integer, db.ForeignKey(add_prefix_for_prod('users.id')), nullable=False)
+    # Copy of the pin's created_at so feed pages sort without touching pins
+    created_at = db.Column(db.DateTime, nullable=False)
+
+
+def _is_fanned_out_on_read(author):
+    # Authors with huge audiences would make every pin write thousands of
+    # rows, their pins are merged into followers' feeds at read time instead
+    return author.followers_count > current_app.config['FEED_FANOUT_MAX_FOLLOWERS']
+
+
+def _trim(user_ids=None):
+    """
+    Deletes everything past the newest FEED_MAX_LENGTH items of the feeds of
+    user_ids, or of every feed
+    """
+    ranked = select(
+        FeedItem.id,
+        func.row_number().over(
+            partition_by=FeedItem.user_id,
+            order_by=(FeedItem.created_at.desc(), FeedItem.pin_id.desc())
+        ).label('position')
+    )
+    if user_ids is not None:
+        ranked = ranked.where(FeedItem.user_id.in_(user_ids))
+    ranked = ranked.subquery()
+
+    db.session.execute(
+        delete(FeedItem)
+        .where(FeedItem.id.in_(
+            select(ranked.c.id).where(ranked.c.position > current_app.config['FEED_MAX_LENGTH'])
+        ))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def fan_out_pin(pin):
+    """
+    Adds a new pin to the feeds of everyone following its author. Feeds
+    aren't trimmed here, ranking every follower's feed would cost far more
+    than the insert, trim_feeds() does it out of the request path.
+    """
+    author = db.session.get(User, pin.user_id)
+    if _is_fanned_out_on_read(author):
+        return
+
+    db.session.execute(
+        FeedItem.__table__.insert().from_select(
+            ['user_id', 'pin_id', 'author_id', 'created_at'],
+            select(Follow.follower_id, literal(pin.id), literal(pin.user_id), literal(pin.created_at, db.DateTime))
+            .where(Follow.followed_id == pin.user_id)
+        )
+    )
+
+
+def backfill_follow(follower_id, followed):
+    """Copies the newest pins of a newly followed user into the follower's feed"""
+    if _is_fanned_out_on_read(followed):
+        return
+
+    newest_pins = select(Pin.id, Pin.user_id, Pin.created_at)\
+        .where(Pin.user_id == followed.id)\
+        .order_by(Pin.created_at.desc(), Pin.id.desc())\
+        .limit(current_app.config['FEED_MAX_LENGTH'])\
+        .subquery()
+    db.session.execute(
+        FeedItem.__table__.insert().from_select(
+            ['user_id', 'pin_id', 'author_id', 'created_at'],
+            select(literal(follower_id), newest_pins.c.id, newest_pins.c.user_id, newest_pins.c.created_at)
+        )
+    )
+    _trim([follower_id])
+
+
+def retract_follow(follower_id, followed_id):
+    """Removes an unfollowed user's pins from the follower's feed"""
+    db.session.execute(
+        delete(FeedItem)
+        .where(FeedItem.user_id == follower_id, FeedItem.author_id == followed_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def trim_feeds():
+    """Cuts every feed back to its newest FEED_MAX_LENGTH items"""
+    _trim()
+    db.session.commit()
+
+
+def feed_query(user_id):
+    """
+    Query for the pins in a user's home feed. Materialized items are merged
+    with the pins of followed authors that are fanned out on read.
+
+    Returns the query and its (created_at, id) sort columns, newest first.
+    """
+    read_time_authors = select(User.id)\
+        .join(Follow, Follow.followed_id == User.id)\
+        .where(
+            Follow.follower_id == user_id,
+            User.followers_count > current_app.config['FEED_FANOUT_MAX_FOLLOWERS']
+        )
+    read_time_author_ids = db.session.execute(read_time_authors).scalars().all()
+
+    if not read_time_author_ids:
+        query = Pin.query\
+            .join(FeedItem, FeedItem.pin_id == Pin.id)\
+            .filter(FeedItem.user_id == user_id)\
+            .order_by(FeedItem.created_at.desc(), FeedItem.pin_id.desc())
+        return query, (FeedItem.created_at, FeedItem.pin_id)
+
+    entries = union(
+        select(FeedItem.pin_id).where(FeedItem.user_id == user_id),
+        select(Pin.id).where(Pin.user_id.in_(read_time_author_ids))
+    ).subquery()
+    query = Pin.query\
+        .join(entries, entries.c.pin_id == Pin.id)\
+        .order_by(Pin.created_at.desc(), Pin.id.desc())
+    return query, (Pin.created_at, Pin.id)
+
+
+def rebuild_feeds():
+    """
+    Rebuilds every materialized feed from the follows and pins tables, for
+    data loaded without going through the API (seeds, imports).
+    """
+    ranked = select(
+        Follow.follower_id.label('user_id'),
+        Pin.id.label('pin_id'),
+        Pin.user_id.label('author_id'),
+        Pin.created_at.label('created_at'),
+        func.row_number().over(
+            partition_by=Follow.follower_id,
+            order_by=(Pin.created_at.desc(), Pin.id.desc())
+        ).label('position')
+    )\
+        .join(Pin, Pin.user_id == Follow.followed_id)\
+        .join(User, User.id == Follow.followed_id)\
+        .where(User.followers_count <= current_app.config['FEED_FANOUT_MAX_FOLLOWERS'])\
+        .subquery()
+
+    db.session.execute(delete(FeedItem))
+    db.session.execute(
+        FeedItem.__table__.insert().from_select(
+            ['user_id', 'pin_id', 'author_id', 'created_at'],
+            select(ranked.c.user_id, ranked.c.pin_id, ranked.c.author_id, ranked.c.created_at)
+            .where(ranked.c.position <= current_app.config['FEED_MAX_LENGTH'])
+        )
+    )
+    db.session.commit()
+
+
+@event.listens_for(Pin, 'before_delete')
+def _remove_deleted_pin_from_feeds(mapper, connection, target):
+    # Runs before the pin row goes so the foreign key is never violated
+    connection.execute(FeedItem.__table__.delete().where(FeedItem.__table__.c.pin_id == target.id))
@@ -16,6 +16,7 @@ class Follow(db.Model):
     __table_args__ = (
         db.UniqueConstraint('follower_id', 'followed_id', name='unique_follow'),
         db.CheckConstraint('follower_id != followed_id', name='no_self_follow'),
+        db.Index('ix_follows_followed_id', 'followed_id'),
         {'schema': SCHEMA} if environment == "production" else {}
     )
 
@@ -28,7 +29,7 @@ class Follow(db.Model):
             'id': self.id,
             'follower_id': self.follower_id,
             'followed_id': self.followed_id,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
 
 
@@ -46,6 +47,8 @@ class BoardFollower(db.Model):
     # Unique constraint
     __table_args__ = (
         db.UniqueConstraint('user_id', 'board_id', name='unique_board_follow'),
+        db.Index('ix_board_followers_board_id', 'board_id'),
+        db.Index('ix_board_followers_user_id_created_at', 'user_id', 'created_at'),
         {'schema': SCHEMA} if environment == "production" else {}
     )
 
@@ -58,5 +61,5 @@ class BoardFollower(db.Model):
             'id': self.id,
             'user_id': self.user_id,
             'board_id': self.board_id,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
\ No newline at end of file
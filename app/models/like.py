@@ -15,6 +15,8 @@ class Like(db.Model):
     # Unique constraint to prevent duplicate likes
     __table_args__ = (
         db.UniqueConstraint('user_id', 'pin_id', name='unique_user_pin_like'),
+        db.Index('ix_likes_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_likes_pin_id', 'pin_id'),
         {'schema': SCHEMA} if environment == "production" else {}
     )
 
@@ -27,5 +29,5 @@ class Like(db.Model):
             'id': self.id,
             'user_id': self.user_id,
             'pin_id': self.pin_id,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
\ No newline at end of file
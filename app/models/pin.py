@@ -4,8 +4,13 @@ from datetime import datetime
 class Pin(db.Model):
     __tablename__ = 'pins'
     
-    if environment == "production":
-        __table_args__ = {'schema': SCHEMA}
+    # Indexes match the access paths of the list endpoints
+    __table_args__ = (
+        db.Index('ix_pins_created_at_id', 'created_at', 'id'),
+        db.Index('ix_pins_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_pins_board_id_created_at', 'board_id', 'created_at'),
+        {'schema': SCHEMA} if environment == "production" else {}
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
@@ -17,6 +22,10 @@ class Pin(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Denormalized counters, maintained by the listeners in counters.py
+    likes_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comments_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     # Relationships
     user = db.relationship('User', back_populates='pins')
     board = db.relationship('Board', back_populates='pins')
@@ -32,8 +41,8 @@ class Pin(db.Model):
             'link': self.link,
             'user_id': self.user_id,
             'board_id': self.board_id,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
         
         if include_user and self.user:
@@ -46,7 +55,8 @@ class Pin(db.Model):
             }
         
         if include_stats:
-            pin_dict['likes_count'] = len(self.likes)
-            pin_dict['comments_count'] = len(self.comments)
+            pin_dict['likes_count'] = self.likes_count
+            pin_dict['comments_count'] = self.comments_count
         
-        return pin_dict
\ No newline at end of file
+        return pin_dict
+
@@ -0,0 +1,171 @@
+from sqlalchemy.orm import aliased
+from .user import User
+from .pin import Pin
+from .board import Board
+from .comment import Comment
+
+# Column projections for the list endpoints. Instead of hydrating ORM
+# instances (identity map, change tracking, relationship loading), list
+# queries select just the columns their JSON needs, joined to the author,
+# and the *_dicts functions build exactly what the to_dict methods return.
+# `flask perf serializers` checks the two stay identical.
+
+# Aliased so it can't clash with a users join already in the query
+author = aliased(User, name='author')
+
+AUTHOR_COLUMNS = (
+    author.id.label('author_id'),
+    author.username.label('author_username'),
+    author.first_name.label('author_first_name'),
+    author.last_name.label('author_last_name'),
+    author.avatar_url.label('author_avatar_url'),
+)
+USER_COLUMNS = (
+    User.id, User.username, User.first_name, User.last_name, User.bio, User.avatar_url,
+    User.website, User.location, User.created_at, User.updated_at,
+)
+PIN_COLUMNS = (
+    Pin.id, Pin.title, Pin.description, Pin.image_url, Pin.link, Pin.user_id, Pin.board_id,
+    Pin.created_at, Pin.updated_at, Pin.likes_count, Pin.comments_count,
+)
+BOARD_COLUMNS = (
+    Board.id, Board.name, Board.description, Board.is_private, Board.user_id, Board.created_at,
+    Board.updated_at, Board.pins_count, Board.followers_count,
+)
+COMMENT_COLUMNS = (
+    Comment.id, Comment.content, Comment.user_id, Comment.pin_id, Comment.created_at, Comment.updated_at,
+)
+
+
+def _author_dict(row):
+    return {
+        'id': row.author_id,
+        'username': row.author_username,
+        'first_name': row.author_first_name,
+        'last_name': row.author_last_name,
+        'avatar_url': row.author_avatar_url
+    }
+
+
+def project_users(query):
+    """Restricts a User query to the columns of user_dicts"""
+    return query.with_entities(*USER_COLUMNS)
+
+
+def user_dicts(rows):
+    """Same as User.to_dict() for every row of project_users"""
+    return [
+        {
+            'id': row.id,
+            'username': row.username,
+            'first_name': row.first_name,
+            'last_name': row.last_name,
+            'bio': row.bio,
+            'avatar_url': row.avatar_url,
+            'website': row.website,
+            'location': row.location,
+            'created_at': row.created_at,
+            'updated_at': row.updated_at
+        }
+        for row in rows
+    ]
+
+
+def project_pins(query, *extra):
+    """
+    Restricts a Pin query to the columns of pin_dicts plus its author's.
+    Extra columns (like sort keys of joined tables) are selected after them.
+    """
+    return query.with_entities(*PIN_COLUMNS, *AUTHOR_COLUMNS, *extra)\
+        .outerjoin(author, author.id == Pin.user_id)
+
+
+def pin_dicts(rows, include_user=True, include_stats=True):
+    """Same as Pin.to_dict() for every row of project_pins"""
+    pins = []
+    for row in rows:
+        pin_dict = {
+            'id': row.id,
+            'title': row.title,
+            'description': row.description,
+            'image_url': row.image_url,
+            'link': row.link,
+            'user_id': row.user_id,
+            'board_id': row.board_id,
+            'created_at': row.created_at,
+            'updated_at': row.updated_at
+        }
+        if include_user and row.author_id is not None:
+            pin_dict['user'] = _author_dict(row)
+        if include_stats:
+            pin_dict['likes_count'] = row.likes_count
+            pin_dict['comments_count'] = row.comments_count
+        pins.append(pin_dict)
+    return pins
+
+
+def project_comments(query):
+    """Restricts a Comment query to the columns of comment_dicts plus its author's"""
+    return query.with_entities(*COMMENT_COLUMNS, *AUTHOR_COLUMNS)\
+        .outerjoin(author, author.id == Comment.user_id)
+
+
+def comment_dicts(rows):
+    """Same as Comment.to_dict() for every row of project_comments"""
+    comments = []
+    for row in rows:
+        comment_dict = {
+            'id': row.id,
+            'content': row.content,
+            'user_id': row.user_id,
+            'pin_id': row.pin_id,
+            'created_at': row.created_at,
+            'updated_at': row.updated_at
+        }
+        if row.author_id is not None:
+            comment_dict['user'] = _author_dict(row)
+        comments.append(comment_dict)
+    return comments
+
+
+def project_boards(query):
+    """Restricts a Board query to the columns of board_dicts plus its owner's"""
+    return query.with_entities(*BOARD_COLUMNS, *AUTHOR_COLUMNS)\
+        .outerjoin(author, author.id == Board.user_id)
+
+
+def board_dicts(rows, include_user=True, include_stats=True, include_pins=False):
+    """
+    Same as Board.to_dict_many() for the rows of project_boards. The first
+    pins of every board come from one windowed query, Board.preview_pins.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+
+    pins_by_board = Board.preview_pins([row.id for row in rows], include_pins, PIN_COLUMNS)
+
+    boards = []
+    for row in rows:
+        board_dict = {
+            'id': row.id,
+            'name': row.name,
+            'description': row.description,
+            'is_private': row.is_private,
+            'user_id': row.user_id,
+            'created_at': row.created_at,
+            'updated_at': row.updated_at
+        }
+        if include_user and row.author_id is not None:
+            board_dict['user'] = _author_dict(row)
+        if include_stats:
+            board_dict['pins_count'] = row.pins_count
+            board_dict['followers_count'] = row.followers_count
+
+        pins = pins_by_board[row.id]
+        if include_pins:
+            board_dict['pins'] = pin_dicts(pins, include_user=False, include_stats=False)
+        if pins:
+            board_dict['cover_image'] = pins[0].image_url
+        boards.append(board_dict)
+    return boards
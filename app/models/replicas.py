@@ -0,0 +1,106 @@
+import itertools
+import threading
+import time
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+
+REPLICA_BIND_PREFIX = 'replica_'
+# Methods whose requests only read, and so may be served by a replica
+READ_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+class RoutingSession(Session):
+    """
+    db.session class that sends the SELECTs of read-only requests to the
+    replica picked for the request by ReplicaRouter. Flushes and every other
+    statement keep going to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context():
+            replica = g.get('db_replica')
+            if replica is not None and getattr(clause, 'is_select', False):
+                return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    """
+    Picks a read replica for each read-only request, round-robin or by least
+    connections in use. Replicas are the SQLALCHEMY_BINDS whose key starts
+    with 'replica_'.
+
+    A user's requests are pinned to the primary for
+    DB_READ_YOUR_WRITES_SECONDS after they write, so they read back their
+    own changes even while the replicas lag behind.
+    """
+
+    def __init__(self, app=None):
+        self.replicas = []
+        self.selection = 'round_robin'
+        self.sticky_seconds = 0
+        self.in_use = {}
+        self.reads = {}
+        self._cycle = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        binds = app.config.get('SQLALCHEMY_BINDS') or {}
+        self.replicas = sorted(key for key in binds if key.startswith(REPLICA_BIND_PREFIX))
+        self.selection = app.config.get('DB_REPLICA_SELECTION', 'round_robin')
+        self.sticky_seconds = app.config.get('DB_READ_YOUR_WRITES_SECONDS', 5)
+        self.in_use = {key: 0 for key in self.replicas}
+        self.reads = {key: 0 for key in self.replicas}
+        self._cycle = itertools.cycle(self.replicas)
+        app.extensions['replica_router'] = self
+
+        if self.replicas:
+            with app.app_context():
+                engines = app.extensions['sqlalchemy'].engines
+                for key in self.replicas:
+                    self._track_connections(engines[key], key)
+
+    def _track_connections(self, engine, key):
+        # Counts the connections each replica has checked out, whatever its
+        # pool class, for least-connections selection
+        def checkout(dbapi_connection, connection_record, connection_proxy):
+            with self._lock:
+                self.in_use[key] += 1
+
+        def checkin(dbapi_connection, connection_record):
+            with self._lock:
+                self.in_use[key] -= 1
+
+        event.listen(engine, 'checkout', checkout)
+        event.listen(engine, 'checkin', checkin)
+
+    def choose(self):
+        with self._lock:
+            if self.selection == 'least_connections':
+                replica = min(self.replicas, key=lambda key: (self.in_use[key], self.reads[key]))
+            else:
+                replica = next(self._cycle)
+            self.reads[replica] += 1
+        return replica
+
+    def route_request(self):
+        """Picks the database the current request reads from"""
+        g.db_replica = None
+        if not self.replicas or request.method not in READ_METHODS:
+            return
+        if session.get('db_primary_until', 0) > time.time():
+            return
+        g.db_replica = self.choose()
+
+    def record_write(self, response):
+        """Pins the user's next reads to the primary after a successful write"""
+        if self.replicas and self.sticky_seconds and request.method not in READ_METHODS and response.status_code < 400:
+            session['db_primary_until'] = time.time() + self.sticky_seconds
+        return response
+
+
+replica_router = ReplicaRouter()
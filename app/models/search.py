@@ -0,0 +1,75 @@
+import re
+from sqlalchemy import false, func, literal_column, or_, text
+from sqlalchemy.sql import table, column
+from .db import db
+from .pin import Pin
+
+
+# Column weights for bm25() on SQLite, title matches outrank description ones
+FTS_TITLE_WEIGHT = 10.0
+FTS_DESCRIPTION_WEIGHT = 5.0
+
+
+def _terms(value):
+    # Only word characters reach the full-text query languages, so user input
+    # can never inject tsquery or FTS5 operators
+    return re.findall(r'\w+', value.lower())
+
+
+def _postgres_search(query, search_terms, category_terms):
+    # search_vector is a generated tsvector column (title weighted A,
+    # description B) backed by a GIN index, see the full-text migration
+    lexemes = [f'{term}:*' for term in search_terms]
+    lexemes += [f'{term}:*A' for term in category_terms]
+    ts_query = func.to_tsquery('english', ' & '.join(lexemes))
+    search_vector = literal_column(f'{Pin.__table__.fullname}.search_vector')
+
+    return query\
+        .filter(search_vector.op('@@')(ts_query))\
+        .order_by(func.ts_rank(search_vector, ts_query).desc(), Pin.created_at.desc())
+
+
+def _sqlite_search(query, search_terms, category_terms):
+    # pins_fts is an external-content FTS5 table kept in sync by triggers
+    pins_fts = table('pins_fts', column('rowid'))
+    phrases = [f'"{term}"*' for term in search_terms]
+    phrases += [f'title : "{term}"*' for term in category_terms]
+
+    return query\
+        .join(pins_fts, pins_fts.c.rowid == Pin.id)\
+        .filter(text('pins_fts MATCH :fts_query').bindparams(fts_query=' AND '.join(phrases)))\
+        .order_by(
+            text(f'bm25(pins_fts, {FTS_TITLE_WEIGHT}, {FTS_DESCRIPTION_WEIGHT})'),
+            Pin.created_at.desc()
+        )
+
+
+def search_pins(query, search='', category=''):
+    """
+    Restricts a Pin query to pins matching the search terms (title or
+    description) and category terms (title only), best match first.
+
+    Uses the full-text index of the current database: a tsvector column with
+    a GIN index on PostgreSQL, an FTS5 table on SQLite. Other databases fall
+    back to ILIKE scans.
+    """
+    search_terms = _terms(search)
+    category_terms = _terms(category)
+    if not search_terms and not category_terms:
+        # Input made only of punctuation can't match anything, blank input
+        # matches everything, newest first
+        if search.strip() or category.strip():
+            return query.filter(false())
+        return query.order_by(Pin.created_at.desc(), Pin.id.desc())
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return _postgres_search(query, search_terms, category_terms)
+    if dialect == 'sqlite':
+        return _sqlite_search(query, search_terms, category_terms)
+
+    for term in search_terms:
+        query = query.filter(or_(Pin.title.ilike(f'%{term}%'), Pin.description.ilike(f'%{term}%')))
+    for term in category_terms:
+        query = query.filter(Pin.title.ilike(f'%{term}%'))
+    return query.order_by(Pin.created_at.desc())
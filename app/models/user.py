@@ -1,7 +1,10 @@
 from .db import db, environment, SCHEMA, add_prefix_for_prod
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime
+from app.passwords import password_hasher
 
 
 class User(db.Model, UserMixin):
@@ -23,6 +26,12 @@ class User(db.Model, UserMixin):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Denormalized counters, maintained by the listeners in counters.py
+    pins_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    boards_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    followers_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    following_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     # Relationships
     pins = db.relationship('Pin', back_populates='user', cascade='all, delete-orphan')
     boards = db.relationship('Board', back_populates='user', cascade='all, delete-orphan')
@@ -40,11 +49,24 @@ class User(db.Model, UserMixin):
 
     @password.setter
     def password(self, password):
-        self.hashed_password = generate_password_hash(password)
+        self.hashed_password = generate_password_hash(password, method=password_hasher.method)
 
     def check_password(self, password):
         return check_password_hash(self.password, password)
 
+    def replace_password_hash(self, new_hash):
+        """
+        Stores a new hash of the same password, unless the password was
+        changed in the meantime. updated_at is kept, the profile didn't change.
+        """
+        users = User.__table__
+        db.session.execute(
+            update(users)
+            .where(users.c.id == self.id, users.c.hashed_password == self.hashed_password)
+            .values(hashed_password=new_hash, updated_at=users.c.updated_at)
+        )
+        set_committed_value(self, 'hashed_password', new_hash)
+
     def to_dict(self, include_stats=False, include_private=False):
         user_dict = {
             'id': self.id,
@@ -55,17 +77,17 @@ class User(db.Model, UserMixin):
             'avatar_url': self.avatar_url,
             'website': self.website,
             'location': self.location,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
         
         if include_private:
             user_dict['email'] = self.email
         
         if include_stats:
-            user_dict['pins_count'] = len(self.pins)
-            user_dict['boards_count'] = len(self.boards)
-            user_dict['followers_count'] = len(self.followers)
-            user_dict['following_count'] = len(self.following)
+            user_dict['pins_count'] = self.pins_count
+            user_dict['boards_count'] = self.boards_count
+            user_dict['followers_count'] = self.followers_count
+            user_dict['following_count'] = self.following_count
         
         return user_dict
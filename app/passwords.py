@@ -0,0 +1,108 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+DEFAULT_METHOD = f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when no hashing slot frees up within PASSWORD_HASH_WAIT_MS"""
+
+
+def _executor_class():
+    # Under gevent a patched ThreadPoolExecutor runs its jobs in greenlets,
+    # which would block the hub just like hashing inline. gevent's own
+    # executor runs them in real threads.
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+            return GeventThreadPoolExecutor
+    except ImportError:
+        pass
+    return ThreadPoolExecutor
+
+
+def _normalize(method):
+    # werkzeug fills in the defaults when it writes the method into a hash
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2':
+        parts += ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)][len(parts) - 1:]
+    return ':'.join(parts)
+
+
+class PasswordHasher:
+    """
+    Hashes and checks passwords on a small pool of threads, at most
+    PASSWORD_HASH_WORKERS at a time per process. hashlib's PBKDF2 releases
+    the GIL, so hashes run in parallel while the request threads of the
+    worker keep serving other requests. Up to PASSWORD_HASH_QUEUE more
+    requests wait for a thread, later ones get PasswordHasherBusy after
+    PASSWORD_HASH_WAIT_MS instead of piling up behind a login spike.
+
+    New hashes use PASSWORD_HASH_METHOD, and verify() hands back a new hash
+    for passwords stored with any other method so logins upgrade (or
+    downgrade) them to the configured cost.
+    """
+
+    def __init__(self, app=None):
+        self.method = DEFAULT_METHOD
+        self.workers = 2
+        self.wait_seconds = 1
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = _normalize(app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD))
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+        self.wait_seconds = app.config.get('PASSWORD_HASH_WAIT_MS', 1000) / 1000
+        self._slots = threading.BoundedSemaphore(self.workers + app.config.get('PASSWORD_HASH_QUEUE', 8))
+        self._executor = None
+        app.extensions['password_hasher'] = self
+
+    def _pool(self):
+        # Created on first use in each process, threads don't survive the
+        # fork of a preloading gunicorn master
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = _executor_class()(max_workers=self.workers, thread_name_prefix='password-hash')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            raise PasswordHasherBusy()
+        try:
+            return self._pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def needs_rehash(self, hashed):
+        return hashed.split('$', 1)[0] != self.method
+
+    def _verify(self, hashed, password):
+        if not check_password_hash(hashed, password):
+            return False, None
+        if self.needs_rehash(hashed):
+            return True, generate_password_hash(password, method=self.method)
+        return True, None
+
+    def hash(self, password):
+        """Hashes password with PASSWORD_HASH_METHOD"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, hashed, password):
+        """
+        Returns whether password matches hashed, and a new hash of it if
+        hashed was made with another method than the configured one
+        """
+        return self._run(self._verify, hashed, password)
+
+
+password_hasher = PasswordHasher()
@@ -1,8 +1,11 @@
+import click
 from flask.cli import AppGroup
 from .users import seed_users, undo_users
 from .pinterest_data import seed_pinterest_data, undo_pinterest_data
+from .synthetic import seed_synthetic
 
 from app.models.db import db, environment, SCHEMA
+from app.models import rebuild_feeds
 
 # Creates a seed group to hold our commands
 # So we can type `flask seed --help`
@@ -21,6 +24,32 @@ def seed():
         undo_users()
     seed_users()
     seed_pinterest_data()
+    # Seeds bypass the API, so materialize the home feeds afterwards
+    rebuild_feeds()
+
+
+# Creates the `flask seed synthetic` command, e.g. for load testing:
+# flask seed synthetic --users 10000 --pins 1000000 --likes-per-pin 5
+@seed_commands.command('synthetic')
+@click.option('--users', default=1000, show_default=True, help='Number of users to create.')
+@click.option('--pins', default=10000, show_default=True, help='Number of pins to create.')
+@click.option('--likes-per-pin', default=3, show_default=True, help='Likes on every pin, from distinct users.')
+@click.option('--boards-per-user', default=3, show_default=True, help='Boards owned by every user.')
+@click.option('--follows-per-user', default=10, show_default=True, help='Users followed by every user.')
+@click.option('--seed', default=0, show_default=True, help='Random seed, the same seed gives the same data.')
+@click.option('--chunk-size', default=10000, show_default=True, help='Rows written per transaction.')
+def synthetic(users, pins, likes_per_pin, boards_per_user, follows_per_user, seed, chunk_size):
+    """Add a large, reproducible synthetic dataset"""
+    if users < 1 or boards_per_user < 1:
+        raise click.BadParameter('--users and --boards-per-user must be at least 1')
+    seed_synthetic(
+        users, pins, likes_per_pin,
+        boards_per_user=boards_per_user,
+        follows_per_user=follows_per_user,
+        seed=seed,
+        chunk_size=chunk_size,
+        log=click.echo
+    )
 
 
 # Creates the `flask seed undo` command
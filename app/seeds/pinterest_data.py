@@ -446,6 +446,7 @@ def undo_pinterest_data():
         db.session.execute(f"TRUNCATE table {SCHEMA}.comments RESTART IDENTITY CASCADE;")
         db.session.execute(f"TRUNCATE table {SCHEMA}.likes RESTART IDENTITY CASCADE;")
         db.session.execute(f"TRUNCATE table {SCHEMA}.follows RESTART IDENTITY CASCADE;")
+        db.session.execute(f"TRUNCATE table {SCHEMA}.feed_items RESTART IDENTITY CASCADE;")
         db.session.execute(f"TRUNCATE table {SCHEMA}.pins RESTART IDENTITY CASCADE;")
         db.session.execute(f"TRUNCATE table {SCHEMA}.boards RESTART IDENTITY CASCADE;")
     else:
@@ -453,6 +454,7 @@ def undo_pinterest_data():
         db.session.execute(text("DELETE FROM comments"))
         db.session.execute(text("DELETE FROM likes"))
         db.session.execute(text("DELETE FROM follows"))
+        db.session.execute(text("DELETE FROM feed_items"))
         db.session.execute(text("DELETE FROM pins"))
         db.session.execute(text("DELETE FROM boards"))
         
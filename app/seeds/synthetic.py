@@ -0,0 +1,203 @@
+import csv
+import io
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, text
+from werkzeug.security import generate_password_hash
+from app.models import db, User, Board, Pin, Like, Follow, reconcile_counters, rebuild_feeds
+
+
+# Every synthetic row is timestamped inside this window, so the same seed
+# always produces exactly the same dataset
+START = datetime(2025, 1, 1)
+SPAN = timedelta(days=365)
+
+WORDS = [
+    'modern', 'cozy', 'rustic', 'minimal', 'vintage', 'bright', 'summer', 'winter',
+    'kitchen', 'living', 'room', 'garden', 'patio', 'bedroom', 'office', 'studio',
+    'pasta', 'coffee', 'cookies', 'salad', 'bread', 'smoothie', 'recipe', 'dinner',
+    'travel', 'beach', 'mountain', 'city', 'hiking', 'island', 'sunset', 'road',
+    'fashion', 'outfit', 'street', 'style', 'denim', 'jacket', 'shoes', 'boho',
+    'diy', 'craft', 'paint', 'wood', 'plants', 'decor', 'lighting', 'art',
+]
+BOARD_NAMES = ['Home Ideas', 'Recipes', 'Travel', 'Style', 'DIY Projects', 'Inspiration', 'Garden', 'Art']
+
+
+def _sentence(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize()
+
+
+def _timestamp(position, total):
+    # Spread rows evenly over the window in id order, like real traffic
+    return START + SPAN * (position / max(total, 1))
+
+
+def _next_id(model):
+    return (db.session.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _copy(model, rows):
+    # COPY streams a CSV buffer in one round trip, much faster than INSERTs
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in columns])
+    buffer.seek(0)
+
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        f'COPY {model.__table__.fullname} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)',
+        buffer
+    )
+
+
+def _write(model, rows, chunk_size):
+    """Writes the rows of a generator in chunks, one transaction per chunk"""
+    use_copy = db.engine.dialect.name == 'postgresql'
+    written = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            _write_chunk(model, chunk, use_copy)
+            written += len(chunk)
+            chunk = []
+    if chunk:
+        _write_chunk(model, chunk, use_copy)
+        written += len(chunk)
+    return written
+
+
+def _write_chunk(model, chunk, use_copy):
+    if use_copy:
+        _copy(model, chunk)
+    else:
+        db.session.execute(model.__table__.insert(), chunk)
+    db.session.commit()
+
+
+def _reset_sequences(models):
+    # Rows were written with explicit ids, move PostgreSQL's sequences past them
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for model in models:
+        table = model.__table__.fullname
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+        ))
+    db.session.commit()
+
+
+def seed_synthetic(users, pins, likes_per_pin, boards_per_user=3, follows_per_user=10, seed=0, chunk_size=10000,
+                   log=print):
+    """
+    Generates a large, reproducible dataset for load testing. Rows are
+    built lazily and written in chunked transactions (COPY on PostgreSQL,
+    executemany INSERTs elsewhere) with explicit ids, so memory stays
+    bounded by chunk_size whatever the dataset size.
+
+    Counters and home feeds are computed in bulk once everything is loaded.
+    """
+    rng = random.Random(seed)
+    # Hashing is deliberately slow, every synthetic user shares one hash
+    hashed_password = generate_password_hash('password')
+
+    first_user_id = _next_id(User)
+    first_board_id = _next_id(Board)
+    first_pin_id = _next_id(Pin)
+    first_like_id = _next_id(Like)
+    first_follow_id = _next_id(Follow)
+
+    def user_rows():
+        for i in range(users):
+            user_id = first_user_id + i
+            created_at = _timestamp(i, users)
+            yield {
+                'id': user_id,
+                'username': f'user{user_id}',
+                'email': f'user{user_id}@example.com',
+                'hashed_password': hashed_password,
+                'first_name': rng.choice(['Alex', 'Sam', 'Jordan', 'Taylor', 'Casey', 'Riley']),
+                'last_name': rng.choice(['Smith', 'Lee', 'Garcia', 'Brown', 'Nguyen', 'Patel']),
+                'bio': _sentence(rng, 4, 10),
+                'avatar_url': None,
+                'website': None,
+                'location': None,
+                'created_at': created_at,
+                'updated_at': created_at,
+            }
+
+    def board_rows():
+        for i in range(users * boards_per_user):
+            created_at = _timestamp(i, users * boards_per_user)
+            yield {
+                'id': first_board_id + i,
+                'name': rng.choice(BOARD_NAMES),
+                'description': _sentence(rng, 3, 8),
+                'is_private': rng.random() < 0.1,
+                'user_id': first_user_id + i // boards_per_user,
+                'created_at': created_at,
+                'updated_at': created_at,
+            }
+
+    def pin_rows():
+        for i in range(pins):
+            user_index = rng.randrange(users)
+            created_at = _timestamp(i, pins)
+            yield {
+                'id': first_pin_id + i,
+                'title': _sentence(rng, 2, 5),
+                'description': _sentence(rng, 8, 20),
+                'image_url': f'https://picsum.photos/seed/{first_pin_id + i}/600/800',
+                'link': None,
+                'user_id': first_user_id + user_index,
+                'board_id': first_board_id + user_index * boards_per_user + rng.randrange(boards_per_user),
+                'created_at': created_at,
+                'updated_at': created_at,
+            }
+
+    def like_rows():
+        like_id = first_like_id
+        for i in range(pins):
+            created_at = _timestamp(i, pins)
+            # Distinct users per pin, so unique_user_pin_like holds
+            for user_index in rng.sample(range(users), min(likes_per_pin, users)):
+                yield {
+                    'id': like_id,
+                    'user_id': first_user_id + user_index,
+                    'pin_id': first_pin_id + i,
+                    'created_at': created_at,
+                }
+                like_id += 1
+
+    def follow_rows():
+        follow_id = first_follow_id
+        for i in range(users):
+            created_at = _timestamp(i, users)
+            # One extra pick covers drawing the user themself (no_self_follow)
+            picks = rng.sample(range(users), min(follows_per_user + 1, users))
+            for followed_index in [pick for pick in picks if pick != i][:follows_per_user]:
+                yield {
+                    'id': follow_id,
+                    'follower_id': first_user_id + i,
+                    'followed_id': first_user_id + followed_index,
+                    'created_at': created_at,
+                }
+                follow_id += 1
+
+    for model, rows in [
+        (User, user_rows()),
+        (Board, board_rows()),
+        (Pin, pin_rows()),
+        (Like, like_rows()),
+        (Follow, follow_rows()),
+    ]:
+        log(f'{model.__tablename__}: {_write(model, rows, chunk_size)} rows')
+
+    _reset_sequences([User, Board, Pin, Like, Follow])
+
+    log('recomputing counters')
+    reconcile_counters()
+    log('rebuilding home feeds')
+    rebuild_feeds()
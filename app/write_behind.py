@@ -0,0 +1,273 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from sqlalchemy import exc, exists, select
+from app.models import db, User, Pin, Board, Like, Follow, BoardFollower, set_counted_rows, backfill_follow, \
+    retract_follow
+from app.cache import response_cache
+from app.events import event_streams
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows, one process flushes at a time anyway
+    fcntl = None
+
+
+# Toggles that can be queued, as kind -> (child model, actor column, target
+# column, owner model, counter of the owner shown in the response)
+KINDS = {
+    'like': (Like, 'user_id', 'pin_id', Pin, 'likes_count'),
+    'follow': (Follow, 'follower_id', 'followed_id', User, 'followers_count'),
+    'board_follow': (BoardFollower, 'user_id', 'board_id', Board, 'followers_count'),
+}
+
+# Errors of the database connection rather than of the toggles, the batch
+# stays queued for the next round
+TRANSIENT_ERRORS = (exc.OperationalError, exc.InterfaceError, exc.TimeoutError)
+
+
+class WriteBehindQueue:
+    """
+    Optional write-behind mode for likes and follows. Instead of changing
+    the database (and contending on the counter rows of popular pins) in the
+    request, toggles are appended to a local SQLite file in WAL mode, synced
+    to disk on every append, and answered at once with the count they will
+    lead to.
+
+    A thread in every process flushes the queue every WRITE_BEHIND_INTERVAL_MS:
+    the toggles of a batch are coalesced to the last one per user and
+    target, and applied with set_counted_rows in one transaction. A file
+    lock makes sure only one process flushes at a time. Toggles are removed
+    from the file only after their batch is committed, so after a crash the
+    batch is simply applied again on the next flush, which is harmless as
+    applying a toggle twice changes nothing.
+
+    A batch that fails for another reason than the database connection is
+    applied again toggle by toggle. Toggles whose user or target was deleted
+    are dropped on the way, and those that still fail are moved to the
+    failed_toggles table instead of holding up the rest of the queue.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.path = None
+        self.interval = 0.5
+        self.batch_size = 1000
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._flushing = threading.Lock()
+        self._flusher = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('WRITE_BEHIND_ENABLED', False)
+        self.path = app.config.get('WRITE_BEHIND_PATH') or os.path.join(tempfile.gettempdir(), 'myday-write-behind.sqlite3')
+        self.interval = app.config.get('WRITE_BEHIND_INTERVAL_MS', 500) / 1000
+        self.batch_size = app.config.get('WRITE_BEHIND_BATCH_SIZE', 1000)
+        app.extensions['write_behind'] = self
+
+    def _connect(self):
+        # Connections can't be shared between threads or forked processes
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # An answered toggle must survive a crash of the machine as well
+            connection.execute('PRAGMA synchronous=FULL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS toggles ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, actor_id INTEGER NOT NULL, '
+                'target_id INTEGER NOT NULL, present INTEGER NOT NULL, queued_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_toggles_kind_actor_target ON toggles (kind, actor_id, target_id)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS failed_toggles ('
+                'id INTEGER PRIMARY KEY, kind TEXT NOT NULL, actor_id INTEGER NOT NULL, target_id INTEGER NOT NULL, '
+                'present INTEGER NOT NULL, queued_at REAL NOT NULL, failed_at REAL NOT NULL, error TEXT NOT NULL)'
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def start(self):
+        """Starts this process's flusher thread, which first replays what a crash left behind"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._flusher is None or self._pid != os.getpid():
+                self._flusher = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._pid = os.getpid()
+                self._flusher.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception:
+                # Kept in the queue, the next round tries again
+                self.app.logger.exception('Write-behind flush failed')
+            time.sleep(self.interval)
+
+    def pending(self, kind, actor_id, target_id):
+        """Whether the last queued toggle adds or removes the row, None if nothing is queued"""
+        if not self.enabled:
+            return None
+        row = self._connect().execute(
+            'SELECT present FROM toggles WHERE kind = ? AND actor_id = ? AND target_id = ? ORDER BY id DESC LIMIT 1',
+            (kind, actor_id, target_id)
+        ).fetchone()
+        return None if row is None else bool(row[0])
+
+    def enqueue(self, kind, actor_id, target_id, present):
+        """
+        Queues a toggle and returns the owner's counter as it will be once
+        the toggle is applied (toggles of other users still in the queue
+        are not counted)
+        """
+        self.start()
+        self._connect().execute(
+            'INSERT INTO toggles (kind, actor_id, target_id, present, queued_at) VALUES (?, ?, ?, ?, ?)',
+            (kind, actor_id, target_id, int(present), time.time())
+        )
+
+        child, actor_column, target_column, owner, counter = KINDS[kind]
+        count, stored = db.session.execute(
+            select(getattr(owner, counter), exists().where(
+                getattr(child, actor_column) == actor_id, getattr(child, target_column) == target_id
+            )).where(owner.id == target_id)
+        ).one()
+        return count + int(present) - int(stored)
+
+    def status(self):
+        """(queued toggles, seconds the oldest has been waiting, failed toggles)"""
+        connection = self._connect()
+        count, oldest = connection.execute('SELECT COUNT(*), MIN(queued_at) FROM toggles').fetchone()
+        failed = connection.execute('SELECT COUNT(*) FROM failed_toggles').fetchone()[0]
+        return count, (time.time() - oldest if oldest else 0), failed
+
+    def flush(self):
+        """
+        Applies queued toggles batch by batch until the queue is empty.
+        Returns how many toggles were applied, or None if another process
+        is flushing.
+        """
+        if not self._flushing.acquire(blocking=False):
+            return None
+        lock_file = open(self.path + '.lock', 'w')
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return None
+            applied = 0
+            while True:
+                rows = self._connect().execute(
+                    'SELECT id, kind, actor_id, target_id, present, queued_at FROM toggles ORDER BY id LIMIT ?',
+                    (self.batch_size,)
+                ).fetchall()
+                if not rows:
+                    return applied
+                try:
+                    self._apply(rows)
+                except TRANSIENT_ERRORS:
+                    raise
+                except Exception:
+                    self.app.logger.exception('Write-behind batch of %s toggles failed, applying them one by one', len(rows))
+                    self._apply_each(rows)
+                # Only once the batch is committed, a crash before this
+                # line replays it
+                self._connect().execute('DELETE FROM toggles WHERE id <= ?', (rows[-1][0],))
+                applied += len(rows)
+        finally:
+            lock_file.close()
+            self._flushing.release()
+
+    def _apply_each(self, rows):
+        # In queue order, so a later toggle of the same user and target still
+        # wins over an earlier one
+        for row in rows:
+            try:
+                self._apply([row])
+            except TRANSIENT_ERRORS:
+                raise
+            except Exception as error:
+                self.app.logger.exception('Write-behind toggle %s failed, moved to failed_toggles', row)
+                self._connect().execute(
+                    'INSERT OR REPLACE INTO failed_toggles '
+                    '(id, kind, actor_id, target_id, present, queued_at, failed_at, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (*row, time.time(), repr(error))
+                )
+
+    def _apply(self, rows):
+        # Later toggles of the same user and target replace earlier ones
+        changes = {}
+        for row_id, kind, actor_id, target_id, present, queued_at in rows:
+            changes.setdefault(kind, {})[(actor_id, target_id)] = bool(present)
+
+        changed = {}
+        try:
+            for kind, kind_changes in changes.items():
+                child, actor_column, target_column, owner, counter = KINDS[kind]
+                changed[kind] = set_counted_rows(child, (actor_column, target_column), kind_changes)
+
+            # Home feeds follow the follows, like in _set_follow
+            inserted, deleted = changed.get('follow', ([], []))
+            if inserted:
+                followed = {user.id: user for user in User.query.filter(User.id.in_({key[1] for key in inserted}))}
+                for follower_id, followed_id in inserted:
+                    backfill_follow(follower_id, followed[followed_id])
+            for follower_id, followed_id in deleted:
+                retract_follow(follower_id, followed_id)
+
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        self._after_commit(changed)
+
+    def _after_commit(self, changed):
+        # The cache invalidations and live updates of the synchronous views
+        inserted, deleted = changed.get('like', ([], []))
+        pin_ids = {key[1] for key in inserted + deleted}
+        if pin_ids:
+            pins = {pin.id: pin for pin in db.session.execute(
+                select(Pin.id, Pin.user_id, Pin.board_id, Pin.likes_count).where(Pin.id.in_(pin_ids))
+            )}
+            for pin in pins.values():
+                response_cache.invalidate(f'pin:{pin.id}')
+                if pin.board_id:
+                    response_cache.invalidate(f'board:{pin.board_id}')
+                event_streams.publish(f'pin:{pin.id}', 'likes', {'pin_id': pin.id, 'likes_count': pin.likes_count})
+
+            # Notifies the owners of the liked pins
+            likers = {user.id: user for user in db.session.execute(
+                select(User.id, User.username, User.first_name, User.last_name, User.avatar_url)
+                .where(User.id.in_({key[0] for key in inserted}))
+            )}
+            for user_id, pin_id in inserted:
+                if pin_id in pins and user_id in likers and pins[pin_id].user_id != user_id:
+                    event_streams.publish(f'user:{pins[pin_id].user_id}', 'like', {
+                        'pin_id': pin_id, 'user': dict(likers[user_id]._mapping)
+                    })
+
+        inserted, deleted = changed.get('follow', ([], []))
+        for follower_id, followed_id in inserted + deleted:
+            response_cache.invalidate(f'user:{follower_id}', f'user:{followed_id}')
+
+        inserted, deleted = changed.get('board_follow', ([], []))
+        board_ids = {key[1] for key in inserted + deleted}
+        if board_ids:
+            for board in db.session.execute(select(Board.id, Board.user_id).where(Board.id.in_(board_ids))):
+                response_cache.invalidate(f'board:{board.id}', f'boards:{board.user_id}')
+
+
+write_behind = WriteBehindQueue()
@@ -0,0 +1,92 @@
+# Gunicorn settings, picked up by `gunicorn -c gunicorn.conf.py app:app`.
+# Every value can be overridden from the environment.
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# 'gthread' serves several requests per process with threads. 'gevent'
+# needs `pip install gevent` (and psycogreen for PostgreSQL), 'sync' is
+# gunicorn's one-request-per-process default.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+# WEB_CONCURRENCY is set by Heroku to fit the dyno's memory
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4 if worker_class == 'gthread' else 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+
+# Read by app.config when the workers import the app. Live updates
+# published in one worker have to reach the streams of the others, and
+# cache invalidations the caches of the others.
+if workers > 1:
+    os.environ.setdefault('EVENTS_BACKEND', 'sqlite')
+    os.environ.setdefault('RESPONSE_CACHE_BACKEND', 'file')
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Restart workers now and then to cap memory growth, staggered so they
+# don't all restart at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = 100
+
+accesslog = '-'
+
+
+def _concurrency(cfg):
+    """Requests one worker process can have in flight at once"""
+    if cfg.worker_class_str == 'gthread':
+        return cfg.threads
+    if cfg.worker_class_str in ('gevent', 'eventlet'):
+        return cfg.worker_connections
+    return 1
+
+
+def post_worker_init(worker):
+    from sqlalchemy.pool import QueuePool
+    from app import app
+    from app.events import event_streams
+    from app.models import db
+    from app.write_behind import write_behind
+
+    # Replays the toggles a crashed worker left in the queue
+    write_behind.start()
+
+    concurrency = _concurrency(worker.cfg)
+
+    # Every open live update stream keeps one of the worker's requests
+    # busy, at least one is always left for the rest of the API (a sync
+    # worker serves no streams at all)
+    if event_streams.max_streams > concurrency - 1:
+        event_streams.max_streams = concurrency - 1
+        worker.log.warning(
+            'Serving at most %s live update streams per %s worker, raise GUNICORN_THREADS '
+            '(or use gevent) for more', event_streams.max_streams, worker.cfg.worker_class_str
+        )
+    if app.config['EVENTS_BACKEND'] == 'memory' and worker.cfg.workers > 1:
+        worker.log.warning(
+            "EVENTS_BACKEND 'memory' only reaches the streams of the publishing worker, "
+            "use 'sqlite' with %s workers", worker.cfg.workers
+        )
+    if app.config['RESPONSE_CACHE_BACKEND'] == 'memory' and worker.cfg.workers > 1:
+        worker.log.warning(
+            "RESPONSE_CACHE_BACKEND 'memory' only invalidates the cache of the writing worker, "
+            "the other %s serve stale responses for up to RESPONSE_CACHE_TTL, use 'file'", worker.cfg.workers - 1
+        )
+
+    # Each request holds a pooled connection for its whole duration, so a
+    # pool smaller than the worker's concurrency makes requests queue for
+    # connections (and time out after DB_POOL_TIMEOUT)
+    with app.app_context():
+        pool = db.engine.pool
+    if not isinstance(pool, QueuePool) or pool._max_overflow < 0:
+        return
+
+    capacity = pool.size() + pool._max_overflow
+    if capacity < concurrency:
+        worker.log.warning(
+            'Database pool of %s connections (DB_POOL_SIZE + DB_MAX_OVERFLOW) is smaller '
+            'than the %s concurrent requests a %s worker can serve, requests will wait '
+            'for connections', capacity, concurrency, worker.cfg.worker_class_str
+        )
@@ -0,0 +1,51 @@
+"""Add denormalized like/comment/pin/follower counters
+
+Revision ID: 3946aa17f92c
+Revises: 86b0a284ab09
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3946aa17f92c'
+down_revision = '86b0a284ab09'
+branch_labels = None
+depends_on = None
+
+
+COUNTER_COLUMNS = {
+    'pins': ['likes_count', 'comments_count'],
+    'boards': ['pins_count', 'followers_count'],
+    'users': ['pins_count', 'boards_count', 'followers_count', 'following_count'],
+}
+
+BACKFILL = [
+    "UPDATE pins SET likes_count = (SELECT COUNT(*) FROM likes WHERE likes.pin_id = pins.id)",
+    "UPDATE pins SET comments_count = (SELECT COUNT(*) FROM comments WHERE comments.pin_id = pins.id)",
+    "UPDATE boards SET pins_count = (SELECT COUNT(*) FROM pins WHERE pins.board_id = boards.id)",
+    "UPDATE boards SET followers_count = (SELECT COUNT(*) FROM board_followers WHERE board_followers.board_id = boards.id)",
+    "UPDATE users SET pins_count = (SELECT COUNT(*) FROM pins WHERE pins.user_id = users.id)",
+    "UPDATE users SET boards_count = (SELECT COUNT(*) FROM boards WHERE boards.user_id = users.id)",
+    "UPDATE users SET followers_count = (SELECT COUNT(*) FROM follows WHERE follows.followed_id = users.id)",
+    "UPDATE users SET following_count = (SELECT COUNT(*) FROM follows WHERE follows.follower_id = users.id)",
+]
+
+
+def upgrade():
+    for table, columns in COUNTER_COLUMNS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column in columns:
+                batch_op.add_column(sa.Column(column, sa.Integer(), nullable=False, server_default='0'))
+
+    for statement in BACKFILL:
+        op.execute(statement)
+
+
+def downgrade():
+    for table, columns in COUNTER_COLUMNS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column in reversed(columns):
+                batch_op.drop_column(column)
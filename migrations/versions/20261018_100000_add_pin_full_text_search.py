@@ -0,0 +1,89 @@
+"""Add full-text search index for pins
+
+Revision ID: a683a9800f95
+Revises: 3946aa17f92c
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a683a9800f95'
+down_revision = '3946aa17f92c'
+branch_labels = None
+depends_on = None
+
+
+# PostgreSQL keeps the generated column up to date on every insert/update
+POSTGRES_UPGRADE = [
+    """
+    ALTER TABLE pins ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX ix_pins_search_vector ON pins USING GIN (search_vector)",
+]
+
+POSTGRES_DOWNGRADE = [
+    "DROP INDEX IF EXISTS ix_pins_search_vector",
+    "ALTER TABLE pins DROP COLUMN IF EXISTS search_vector",
+]
+
+# SQLite uses an external-content FTS5 table, maintained by triggers. The
+# update trigger only fires for the indexed columns so counter bumps on pins
+# never touch the index.
+SQLITE_UPGRADE = [
+    """
+    CREATE VIRTUAL TABLE pins_fts USING fts5(
+        title, description, content='pins', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER pins_fts_insert AFTER INSERT ON pins BEGIN
+        INSERT INTO pins_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER pins_fts_delete AFTER DELETE ON pins BEGIN
+        INSERT INTO pins_fts(pins_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER pins_fts_update AFTER UPDATE OF title, description ON pins BEGIN
+        INSERT INTO pins_fts(pins_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO pins_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    "INSERT INTO pins_fts(pins_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS pins_fts_update",
+    "DROP TRIGGER IF EXISTS pins_fts_delete",
+    "DROP TRIGGER IF EXISTS pins_fts_insert",
+    "DROP TABLE IF EXISTS pins_fts",
+]
+
+
+def _run(postgres, sqlite):
+    dialect = op.get_bind().dialect.name
+    statements = {'postgresql': postgres, 'sqlite': sqlite}.get(dialect, [])
+    for statement in statements:
+        op.execute(sa.text(statement))
+
+
+def upgrade():
+    _run(POSTGRES_UPGRADE, SQLITE_UPGRADE)
+
+
+def downgrade():
+    _run(POSTGRES_DOWNGRADE, SQLITE_DOWNGRADE)
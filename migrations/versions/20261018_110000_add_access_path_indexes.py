@@ -0,0 +1,42 @@
+"""Add indexes on foreign keys and sort columns
+
+Revision ID: f3b435c745d5
+Revises: a683a9800f95
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b435c745d5'
+down_revision = 'a683a9800f95'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns). B-tree indexes are scanned backwards for the
+# newest-first ORDER BYs, so ascending (fk, created_at) covers them.
+INDEXES = [
+    ('ix_pins_created_at_id', 'pins', ['created_at', 'id']),
+    ('ix_pins_user_id_created_at', 'pins', ['user_id', 'created_at']),
+    ('ix_pins_board_id_created_at', 'pins', ['board_id', 'created_at']),
+    ('ix_boards_user_id_created_at', 'boards', ['user_id', 'created_at']),
+    ('ix_comments_pin_id_created_at', 'comments', ['pin_id', 'created_at']),
+    ('ix_comments_user_id', 'comments', ['user_id']),
+    ('ix_likes_user_id_created_at', 'likes', ['user_id', 'created_at']),
+    ('ix_likes_pin_id', 'likes', ['pin_id']),
+    ('ix_follows_followed_id', 'follows', ['followed_id']),
+    ('ix_board_followers_board_id', 'board_followers', ['board_id']),
+    ('ix_board_followers_user_id_created_at', 'board_followers', ['user_id', 'created_at']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
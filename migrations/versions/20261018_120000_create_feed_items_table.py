@@ -0,0 +1,66 @@
+"""Create feed_items table for materialized home feeds
+
+Revision ID: d77de741ec50
+Revises: f3b435c745d5
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.config import Config
+from app.models.db import SCHEMA, environment, add_prefix_for_prod
+
+
+# revision identifiers, used by Alembic.
+revision = 'd77de741ec50'
+down_revision = 'f3b435c745d5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('feed_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('pin_id', sa.Integer(), nullable=False),
+        sa.Column('author_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['author_id'], [add_prefix_for_prod('users.id')], ),
+        sa.ForeignKeyConstraint(['pin_id'], [add_prefix_for_prod('pins.id')], ),
+        sa.ForeignKeyConstraint(['user_id'], [add_prefix_for_prod('users.id')], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'pin_id', name='unique_feed_item')
+    )
+
+    op.create_index('ix_feed_items_user_id_created_at_pin_id', 'feed_items', ['user_id', 'created_at', 'pin_id'], unique=False)
+    op.create_index('ix_feed_items_user_id_author_id', 'feed_items', ['user_id', 'author_id'], unique=False)
+    op.create_index('ix_feed_items_pin_id', 'feed_items', ['pin_id'], unique=False)
+
+    if environment == "production":
+        op.execute(f"ALTER TABLE feed_items SET SCHEMA {SCHEMA};")
+
+    # Materialize the newest pins of every followed author that is fanned out
+    # on write
+    op.execute(sa.text("""
+        INSERT INTO feed_items (user_id, pin_id, author_id, created_at)
+        SELECT user_id, pin_id, author_id, created_at FROM (
+            SELECT follows.follower_id AS user_id, pins.id AS pin_id,
+                   pins.user_id AS author_id, pins.created_at AS created_at,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY follows.follower_id
+                       ORDER BY pins.created_at DESC, pins.id DESC
+                   ) AS position
+            FROM follows
+            JOIN pins ON pins.user_id = follows.followed_id
+            JOIN users ON users.id = follows.followed_id
+            WHERE users.followers_count <= :max_followers
+        ) AS ranked
+        WHERE position <= :max_length
+    """).bindparams(max_followers=Config.FEED_FANOUT_MAX_FOLLOWERS, max_length=Config.FEED_MAX_LENGTH))
+
+
+def downgrade():
+    op.drop_index('ix_feed_items_pin_id', table_name='feed_items')
+    op.drop_index('ix_feed_items_user_id_author_id', table_name='feed_items')
+    op.drop_index('ix_feed_items_user_id_created_at_pin_id', table_name='feed_items')
+    op.drop_table('feed_items')
@@ -1,12 +1,17 @@
 import { useState, useEffect } from 'react';
 import { commentsApi } from '../../utils/api';
+import useEventStream from '../../hooks/useEventStream';
 import Comment from './Comment';
 import CommentForm from './CommentForm';
 import styles from './CommentSection.module.css';
 
-const CommentSection = ({ pinId, pinOwnerId }) => {
+const CommentSection = ({ pinId, pinOwnerId, commentsCount }) => {
   const [comments, setComments] = useState([]);
+  const [total, setTotal] = useState(commentsCount);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [latestCursor, setLatestCursor] = useState(null);
   const [isLoading, setIsLoading] = useState(true);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [error, setError] = useState(null);
 
   useEffect(() => {
@@ -14,6 +19,8 @@ const CommentSection = ({ pinId, pinOwnerId }) => {
       try {
         const data = await commentsApi.getPinComments(pinId);
         setComments(data.comments);
+        setNextCursor(data.next_cursor);
+        setLatestCursor(data.latest_cursor);
       } catch (err) {
         setError('Failed to load comments');
         console.error('Error fetching comments:', err);
@@ -26,8 +33,53 @@ const CommentSection = ({ pinId, pinOwnerId }) => {
     }
   }, [pinId]);
 
+  const loadMoreComments = async () => {
+    setIsLoadingMore(true);
+    try {
+      const data = await commentsApi.getPinComments(pinId, { cursor: nextCursor });
+      setComments(prev => [...prev, ...data.comments]);
+      setNextCursor(data.next_cursor);
+    } catch (err) {
+      console.error('Error fetching comments:', err);
+    }
+    setIsLoadingMore(false);
+  };
+
+  const addComments = (newComments) => {
+    // Our own comments come back through the live updates too
+    setComments(prev => [
+      ...newComments.filter(comment => !prev.some(existing => existing.id === comment.id)),
+      ...prev
+    ]);
+  };
+
+  // Live updates of the comments others post, edit and delete
+  useEventStream(pinId ? `/events/pins/${pinId}` : null, {
+    comment_created: (data) => {
+      addComments([data.comment]);
+      setTotal(data.comments_count);
+    },
+    comment_updated: (data) => handleUpdateComment(data.comment),
+    comment_deleted: (data) => {
+      setComments(prev => prev.filter(comment => comment.id !== data.comment_id));
+      setTotal(data.comments_count);
+    },
+    // Sent when updates were dropped, fetch whatever was missed
+    resync: async () => {
+      try {
+        const data = await commentsApi.getPinComments(pinId, latestCursor ? { since: latestCursor } : {});
+        addComments(data.comments);
+        setLatestCursor(data.latest_cursor);
+      } catch (err) {
+        console.error('Error fetching comments:', err);
+      }
+    },
+  });
+
   const handleNewComment = (newComment) => {
-    setComments(prev => [newComment, ...prev]);
+    if (comments.some(comment => comment.id === newComment.id)) return;
+    addComments([newComment]);
+    setTotal(prev => (prev ?? 0) + 1);
   };
 
   const handleUpdateComment = (updatedComment) => {
@@ -40,6 +92,7 @@ const CommentSection = ({ pinId, pinOwnerId }) => {
 
   const handleDeleteComment = (commentId) => {
     setComments(prev => prev.filter(comment => comment.id !== commentId));
+    setTotal(prev => (prev ?? 1) - 1);
   };
 
   if (isLoading) {
@@ -61,7 +114,7 @@ const CommentSection = ({ pinId, pinOwnerId }) => {
   return (
     <div className={styles.commentSection}>
       <div className={styles.header}>
-        <h3>Comments ({comments.length})</h3>
+        <h3>Comments ({Math.max(total ?? 0, comments.length)})</h3>
       </div>
 
       <CommentForm 
@@ -86,6 +139,16 @@ const CommentSection = ({ pinId, pinOwnerId }) => {
           ))
         )}
       </div>
+
+      {nextCursor && (
+        <button
+          className={styles.loadMore}
+          onClick={loadMoreComments}
+          disabled={isLoadingMore}
+        >
+          {isLoadingMore ? 'Loading...' : 'Show more comments'}
+        </button>
+      )}
     </div>
   );
 };
@@ -7,6 +7,7 @@ import { useModal } from '../../context/Modal';
 import { SavePinModal } from '../SavePin';
 import { CommentSection } from '../Comment';
 import { pinsApi, usersApi } from '../../utils/api';
+import useEventStream from '../../hooks/useEventStream';
 import { UserAvatar } from '../UI';
 import styles from './PinDetailModal.module.css';
 
@@ -69,6 +70,13 @@ export const PinDetailModal = ({ pin: initialPin, onLike, onSave }) => {
     }
   }, [pin.id, currentUser]);
 
+  // Likes of other users show up live, the comment section shares the stream
+  useEventStream(pin.id ? `/events/pins/${pin.id}` : null, {
+    likes: (data) => {
+      if (!loading.like) setLikesCount(data.likes_count);
+    },
+  });
+
   const handleLike = async () => {
     if (loading.like || !currentUser) return;
     
@@ -340,7 +348,7 @@ export const PinDetailModal = ({ pin: initialPin, onLike, onSave }) => {
               </div>
             )}
 
-            <CommentSection pinId={pin.id} pinOwnerId={pin.user?.id} />
+            <CommentSection pinId={pin.id} pinOwnerId={pin.user?.id} commentsCount={pin.comments_count} />
 
             {relatedPins.length > 0 && (
               <div className={styles.relatedSection}>
@@ -41,7 +41,9 @@ const FollowButton = ({
     setIsFollowing(newFollowing);
     
     try {
-      const response = await usersApi.followUser(userId);
+      const response = newFollowing
+        ? await usersApi.followUser(userId)
+        : await usersApi.unfollowUser(userId);
       setIsFollowing(response.following);
       
       if (onFollowChange) {
@@ -0,0 +1,42 @@
+import { useEffect, useRef } from 'react';
+import { openEventStream } from '../utils/api';
+
+// Components listening to the same endpoint share one connection, every
+// open stream takes up a server worker thread
+const streams = new Map();
+
+const useEventStream = (endpoint, handlers) => {
+  const handlersRef = useRef(handlers);
+  handlersRef.current = handlers;
+
+  useEffect(() => {
+    if (!endpoint) return;
+
+    let stream = streams.get(endpoint);
+    if (!stream) {
+      stream = { source: openEventStream(endpoint), users: 0 };
+      streams.set(endpoint, stream);
+    }
+    stream.users += 1;
+
+    const listeners = Object.keys(handlersRef.current).map(name => {
+      const listener = (event) => {
+        const handler = handlersRef.current[name];
+        if (handler) handler(JSON.parse(event.data));
+      };
+      stream.source.addEventListener(name, listener);
+      return [name, listener];
+    });
+
+    return () => {
+      listeners.forEach(([name, listener]) => stream.source.removeEventListener(name, listener));
+      stream.users -= 1;
+      if (stream.users === 0) {
+        stream.source.close();
+        streams.delete(endpoint);
+      }
+    };
+  }, [endpoint]);
+};
+
+export default useEventStream;
@@ -13,7 +13,7 @@ const categories = [
 
 export const Home = () => {
   const dispatch = useDispatch();
-  const { items: pins, loading, hasMore, error, currentPage } = useSelector(state => state.pins);
+  const { items: pins, loading, hasMore, error, nextCursor } = useSelector(state => state.pins);
   const user = useSelector(state => state.session.user);
   const { registerSearchCallback, unregisterSearchCallback, currentSearch } = useSearch();
   
@@ -28,7 +28,7 @@ export const Home = () => {
   useEffect(() => {
     if (!hasInitialLoad.current && pins.length === 0 && !loading && !error) {
       hasInitialLoad.current = true;
-      dispatch(fetchPins({ page: 1, per_page: 20 }))
+      dispatch(fetchPins({ cursor: '', per_page: 20 }))
         .catch(() => {
           // Reset the flag on error so user can retry
           hasInitialLoad.current = false;
@@ -44,7 +44,7 @@ export const Home = () => {
     if (query.trim()) {
       dispatch(searchPins(query, { page: 1, per_page: 20 }));
     } else {
-      dispatch(fetchPins({ page: 1, per_page: 20 }));
+      dispatch(fetchPins({ cursor: '', per_page: 20 }));
     }
   }, [dispatch]);
 
@@ -56,32 +56,35 @@ export const Home = () => {
   }, [registerSearchCallback, unregisterSearchCallback, handleSearchFromHeader]);
 
   const handleLoadMore = useCallback(async () => {
-    if (loading || !hasMore) return; // Prevent multiple simultaneous requests
+    if (loading || !hasMore || !nextCursor) return; // Prevent multiple simultaneous requests
     
-    const nextPage = currentPage + 1;
-    console.log('Loading more pins, page:', nextPage);
+    // Keyset pages cost the same however far down the feed the user is
+    const params = { cursor: nextCursor, per_page: 20 };
+    if (activeFilter !== 'All') {
+      params.category = activeFilter;
+    }
     
     try {
-      await dispatch(fetchPins({ page: nextPage, per_page: 20, category: activeFilter !== 'All' ? activeFilter : undefined }));
+      await dispatch(fetchPins(params));
     } catch (error) {
       console.error('Failed to load more pins:', error);
     }
-  }, [dispatch, currentPage, activeFilter, loading, hasMore]);
+  }, [dispatch, nextCursor, activeFilter, loading, hasMore]);
 
 
   const handleFilterChange = async (filter) => {
     setActiveFilter(filter);
     
-    const params = { page: 1, per_page: 20 };
+    const params = { per_page: 20 };
     if (filter !== 'All') {
       params.category = filter;
     }
     
     try {
       if (searchQuery) {
-        await dispatch(searchPins(searchQuery, params));
+        await dispatch(searchPins(searchQuery, { ...params, page: 1 }));
       } else {
-        await dispatch(fetchPins(params));
+        await dispatch(fetchPins({ ...params, cursor: '' }));
       }
     } catch (error) {
       console.error('Filter change failed:', error);
@@ -157,7 +160,7 @@ export const Home = () => {
         {error && (
           <div className={styles.error}>
             <p>Error loading pins: {error}</p>
-            <button onClick={() => dispatch(fetchPins({ page: 1, per_page: 20 }))}>
+            <button onClick={() => dispatch(fetchPins({ cursor: '', per_page: 20 }))}>
               Try again
             </button>
           </div>
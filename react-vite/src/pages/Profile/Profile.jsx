@@ -60,7 +60,11 @@ export const Profile = () => {
     if (!currentUser || isOwnProfile) return;
 
     try {
-      await usersApi.followUser(displayUserId);
+      if (following) {
+        await usersApi.unfollowUser(displayUserId);
+      } else {
+        await usersApi.followUser(displayUserId);
+      }
       setFollowing(!following);
     } catch (error) {
       console.error('Failed to toggle follow:', error);
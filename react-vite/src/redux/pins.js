@@ -53,7 +53,12 @@ export const fetchPins = (params = {}) => async (dispatch) => {
   try {
     const data = await pinsApi.getPins(params);
     
-    if (params.page === 1 || !params.page) {
+    // Cursor pages continue the list; an empty cursor starts a new one
+    const isFirstPage = params.cursor !== undefined
+      ? !params.cursor
+      : params.page === 1 || !params.page;
+    
+    if (isFirstPage) {
       dispatch(setPins(data));
     } else {
       dispatch(addPins(data));
@@ -148,6 +153,7 @@ const initialState = {
   hasMore: true,
   currentPage: 1,
   totalPages: 1,
+  nextCursor: null,
 };
 
 // Reducer
@@ -160,6 +166,7 @@ const pinsReducer = (state = initialState, action) => {
         hasMore: action.payload.has_next !== undefined ? action.payload.has_next : true,
         currentPage: action.payload.page || 1,
         totalPages: action.payload.pages || 1,
+        nextCursor: action.payload.next_cursor || null,
       };
       
     case ADD_PINS:
@@ -169,6 +176,7 @@ const pinsReducer = (state = initialState, action) => {
         hasMore: action.payload.has_next !== undefined ? action.payload.has_next : false,
         currentPage: action.payload.page || state.currentPage + 1,
         totalPages: action.payload.pages || state.totalPages,
+        nextCursor: action.payload.next_cursor || null,
       };
       
     case ADD_PIN:
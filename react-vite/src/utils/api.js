@@ -143,8 +143,8 @@ export const usersApi = {
     method: 'PUT',
     body: userData,
   }),
-  followUser: (id) => apiRequest(`/users/${id}/follow`, { method: 'POST' }),
-  unfollowUser: (id) => apiRequest(`/users/${id}/follow`, { method: 'POST' }),
+  followUser: (id) => apiRequest(`/users/${id}/follow`, { method: 'PUT' }),
+  unfollowUser: (id) => apiRequest(`/users/${id}/follow`, { method: 'DELETE' }),
   getFollowStatus: (id) => apiRequest(`/users/${id}/follow-status`),
   getUserFollowers: (id, params = {}) => {
     const searchParams = new URLSearchParams(params);
@@ -171,7 +171,10 @@ export const usersApi = {
 
 // Comments API
 export const commentsApi = {
-  getPinComments: (pinId) => apiRequest(`/comments/pin/${pinId}`),
+  getPinComments: (pinId, params = {}) => {
+    const searchParams = new URLSearchParams(params);
+    return apiRequest(`/comments/pin/${pinId}?${searchParams}`);
+  },
   createComment: (commentData) => apiRequest('/comments', {
     method: 'POST',
     body: commentData,
@@ -183,4 +186,10 @@ export const commentsApi = {
   deleteComment: (id) => apiRequest(`/comments/${id}`, { method: 'DELETE' }),
 };
 
+// Live updates (Server-Sent Events). EventSource reconnects by itself and
+// resumes where it left off.
+export const openEventStream = (endpoint) => new EventSource(`${BASE_URL}${endpoint}`, {
+  withCredentials: true,
+});
+
 export { ApiError };
\ No newline at end of file